@@ -0,0 +1,258 @@
+from datetime import date as Date
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+import numpy as np
+
+from currencyindex import resolve_codes
+
+_EPOCH_ORDINAL = Date(1970, 1, 1).toordinal()
+_SECONDS_PER_DAY = 86400
+_MAX_ORDINAL = Date.max.toordinal()
+
+
+class AsOfRateIndex:
+    """
+    Daily USD based rate snapshots sorted by date, for point-in-time conversions.
+
+    All days share one float64 matrix with a row per day and a column per
+    currency, NaN where a day has no rate for a currency. A time resolves to the
+    last day at or before it with a binary search over the sorted day ordinals,
+    so a batch of timestamped amounts converts with one searchsorted call and
+    two indexed lookups, however many days are loaded.
+
+    Days loaded without rates, e.g. days the API has no data for, are
+    remembered so they aren't requested again, and times on them resolve to the
+    day before.
+    """
+
+    def __init__(self, snapshots: dict[str, dict[str, float]] | None = None):
+        """
+        Initialize the index.
+
+        Args:
+            snapshots: Rates keyed by date in YYYY-MM-DD format, as returned by
+                CurrencyHandler.load_historical_rates.
+        """
+        self._snapshots: dict[int, dict[str, float]] = {}
+        self._known: set[int] = set()
+        self._ordinals = np.empty(0, dtype=np.int64)
+        self._code_index: dict[str, int] = {}
+        self._matrix = np.full((1, 1), np.nan)
+        if snapshots:
+            self.update(snapshots)
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def __contains__(self, date: object) -> bool:
+        try:
+            return day_ordinal(date) in self._known
+        except ValueError:
+            return False
+
+    @property
+    def dates(self) -> list[str]:
+        """
+        Days that have rates, in YYYY-MM-DD format, oldest first.
+        """
+        return [
+            Date.fromordinal(ordinal).isoformat() for ordinal in self._ordinals.tolist()
+        ]
+
+    def update(self, snapshots: dict[str, dict[str, float]]) -> None:
+        """
+        Add or replace the rates of some days.
+
+        Args:
+            snapshots: Rates keyed by date in YYYY-MM-DD format. Days with an
+                empty dictionary are recorded as having no rates.
+
+        Raises:
+            ValueError: If a date isn't in YYYY-MM-DD format.
+        """
+        for day, rates in snapshots.items():
+            ordinal = Date.fromisoformat(day).toordinal()
+            self._known.add(ordinal)
+            if rates:
+                self._snapshots[ordinal] = rates
+        self._rebuild()
+
+    def rates_at(self, timestamp: Any) -> tuple[str, dict[str, float]] | None:
+        """
+        Get the rates in effect at a point in time.
+
+        Args:
+            timestamp: Unix time in seconds, a datetime, a date or an ISO 8601
+                string. Naive datetimes are taken as UTC.
+
+        Returns:
+            A (date, rates) tuple for the last day at or before the timestamp
+            that has rates, or None if there is no such day.
+
+        Raises:
+            ValueError: If the timestamp can't be parsed.
+        """
+        position = int(
+            np.searchsorted(self._ordinals, day_ordinal(timestamp), side="right")
+        )
+        if position == 0:
+            return None
+        ordinal = int(self._ordinals[position - 1])
+        return Date.fromordinal(ordinal).isoformat(), dict(self._snapshots[ordinal])
+
+    def convert(
+        self,
+        timestamps: Iterable[Any],
+        amounts: Any,
+        from_currencies: str | Any,
+        to_currencies: str | Any,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Convert amounts at the rates in effect at their timestamps.
+
+        Args:
+            timestamps: One timestamp per amount, in any form rates_at takes.
+                Arrays of Unix times are resolved without a Python loop.
+            amounts: Sequence or array of amounts to convert.
+            from_currencies: One 3-letter code for all rows, or one code per amount.
+            to_currencies: One 3-letter code for all rows, or one code per amount.
+
+        Returns:
+            A tuple of (converted, invalid, rate_dates), see convert_ordinals.
+
+        Raises:
+            ValueError: If a timestamp can't be parsed or the lengths differ.
+        """
+        return self.convert_ordinals(
+            day_ordinals(timestamps), amounts, from_currencies, to_currencies
+        )
+
+    def convert_ordinals(
+        self,
+        ordinals: Any,
+        amounts: Any,
+        from_currencies: str | Any,
+        to_currencies: str | Any,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Convert amounts at the rates in effect on days given as ordinals.
+
+        Args:
+            ordinals: One day per amount, as returned by date.toordinal. Rows
+                with 0 have no day and are invalid.
+            amounts: Sequence or array of amounts to convert.
+            from_currencies: One 3-letter code for all rows, or one code per amount.
+            to_currencies: One 3-letter code for all rows, or one code per amount.
+
+        Returns:
+            A tuple of (converted, invalid, rate_dates). converted holds the
+            converted amounts as float64 with NaN for rows that could not be
+            converted. invalid marks the rows without a rate for either
+            currency on or before their day. rate_dates holds the day whose
+            rates were used as datetime64[D], NaT where there was none.
+
+        Raises:
+            ValueError: If the arrays have different lengths.
+        """
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+
+        # Times before the first day land on -1, the trailing all-NaN row.
+        rows = np.searchsorted(self._ordinals, ordinals, side="right") - 1
+        if ordinals.shape != amounts.shape:
+            raise ValueError("Timestamps and amounts must have the same length.")
+        from_columns = resolve_codes(from_currencies, self._code_index, amounts.shape)
+        to_columns = resolve_codes(to_currencies, self._code_index, amounts.shape)
+
+        from_rates = self._matrix[rows, from_columns]
+        to_rates = self._matrix[rows, to_columns]
+        converted = amounts / from_rates * to_rates
+
+        invalid = np.isnan(from_rates) | np.isnan(to_rates)
+        found = rows >= 0
+        rate_dates = np.full(rows.shape, np.datetime64("NaT"), dtype="datetime64[D]")
+        rate_dates[found] = (self._ordinals[rows[found]] - _EPOCH_ORDINAL).astype(
+            "datetime64[D]"
+        )
+        return converted, np.broadcast_to(invalid, converted.shape), rate_dates
+
+    def _rebuild(self) -> None:
+        ordinals = sorted(self._snapshots)
+        codes: dict[str, int] = {}
+        for ordinal in ordinals:
+            for code in self._snapshots[ordinal]:
+                codes.setdefault(code, len(codes))
+
+        # The extra row and column stay NaN for unknown days and codes.
+        matrix = np.full((len(ordinals) + 1, len(codes) + 1), np.nan)
+        for row, ordinal in enumerate(ordinals):
+            rates = self._snapshots[ordinal]
+            columns = np.fromiter(
+                (codes[code] for code in rates), dtype=np.intp, count=len(rates)
+            )
+            matrix[row, columns] = np.fromiter(
+                rates.values(), dtype=np.float64, count=len(rates)
+            )
+
+        self._ordinals = np.array(ordinals, dtype=np.int64)
+        self._code_index = codes
+        self._matrix = matrix
+
+
+def day_ordinal(timestamp: Any) -> int:
+    """
+    Get the UTC day of a timestamp as a date ordinal.
+
+    Args:
+        timestamp: Unix time in seconds, a datetime, a date or an ISO 8601
+            string. Naive datetimes are taken as UTC.
+
+    Returns:
+        The ordinal of the day, as returned by date.toordinal.
+
+    Raises:
+        ValueError: If the timestamp can't be parsed.
+    """
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc)
+        return timestamp.toordinal()
+    if isinstance(timestamp, Date):
+        return timestamp.toordinal()
+    if isinstance(timestamp, str):
+        try:
+            return day_ordinal(datetime.fromisoformat(timestamp.strip()))
+        except ValueError as e:
+            raise ValueError(f"Invalid timestamp '{timestamp}'.") from e
+    try:
+        ordinal = _EPOCH_ORDINAL + int(float(timestamp) // _SECONDS_PER_DAY)
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ValueError(f"Invalid timestamp '{timestamp}'.") from e
+    if not 1 <= ordinal <= _MAX_ORDINAL:
+        raise ValueError(f"Timestamp '{timestamp}' is out of range.")
+    return ordinal
+
+
+def day_ordinals(timestamps: Iterable[Any]) -> np.ndarray:
+    """
+    Get the UTC days of many timestamps as date ordinals.
+
+    Args:
+        timestamps: Timestamps in any form day_ordinal takes.
+
+    Returns:
+        An int64 array of date ordinals.
+
+    Raises:
+        ValueError: If a timestamp can't be parsed.
+    """
+    if isinstance(timestamps, np.ndarray) and timestamps.dtype.kind in "iuf":
+        if not np.isfinite(timestamps).all():
+            raise ValueError("Timestamps must be finite.")
+        days = np.floor_divide(timestamps, _SECONDS_PER_DAY).astype(np.int64)
+        return days + _EPOCH_ORDINAL
+    return np.fromiter(
+        (day_ordinal(timestamp) for timestamp in timestamps), dtype=np.int64
+    )
+
@@ -0,0 +1,321 @@
+import asyncio
+import math
+import time
+from datetime import date as Date
+from datetime import timedelta
+from typing import Any
+
+import aiohttp
+
+from historicalstore import HistoricalRateStore
+
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Statuses the historical endpoint answers with for days it has no data for.
+_NO_DATA_STATUSES = (400, 404)
+
+
+class AsyncCurrencyHandler:
+    """
+    asyncio version of CurrencyHandler for use inside event loops.
+
+    All network calls go through one aiohttp session with a bounded connection
+    pool. Concurrent callers asking for the same URL share a single in-flight
+    request, and conversions share one in-memory rate snapshot.
+    """
+
+    def __init__(
+        self,
+        base_currency: str = "USD",
+        cache_ttl: float = 3600,
+        history_path: str = "historical_rates.bin",
+        max_connections: int = 100,
+        timeout: tuple[float, float] = (3.05, 10),
+        max_retries: int = 3,
+        api_base_url: str = "https://openexchangerates.org/api",
+    ):
+        """
+        Initialize the AsyncCurrencyHandler.
+
+        No network call is made here, the first snapshot is fetched by the first
+        coroutine that needs it.
+
+        Args:
+            base_currency: 3-letter code of the base currency.
+            cache_ttl: Seconds a rate snapshot is considered fresh.
+            history_path: Path of the binary file historical rates are stored in.
+            max_connections: Maximum number of open connections to the API.
+            timeout: Connect and read timeout in seconds for every API request.
+            max_retries: Number of retries, with exponential backoff, for failed
+                requests before giving up.
+            api_base_url: Base URL of the openexchangerates API, e.g. a local
+                stand-in server for benchmarks.
+        """
+        self.app_id = "f33364a5d1c040b6b44597e443dfc1f4"
+        self.api_base_url = api_base_url
+        self.latest_api_url = f"{api_base_url}/latest.json?app_id={self.app_id}"
+        self.currency_api_url = f"{api_base_url}/currencies.json?prettyprint=false&show_alternative=false&show_inactive=false&app_id={self.app_id}"
+        self.historical_api_url = f"{api_base_url}/historical/{{date}}.json?app_id={self.app_id}&base=USD"
+        self.base_currency = base_currency
+        self.cache_ttl = cache_ttl
+        self.historical_store = HistoricalRateStore(history_path)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._session: aiohttp.ClientSession | None = None
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._snapshot: dict[str, Any] | None = None
+        self._snapshot_time = 0.0
+
+    async def __aenter__(self) -> "AsyncCurrencyHandler":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Close the HTTP session and its connection pool.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch_currency_data(self) -> dict[str, Any]:
+        """
+        Fetch the latest currency exchange rate data from the openexchangerates API.
+
+        Returns:
+            A dictionary containing the latest exchange rates and metadata.
+
+        Raises:
+            ConnectionError: If the server can't be reached or the response is invalid.
+            TimeoutError: If the server doesn't respond in time.
+        """
+        fetch_data = await self._get_json(self.latest_api_url)
+
+        if "rates" in fetch_data:
+            self._snapshot = fetch_data
+            self._snapshot_time = time.time()
+
+        return fetch_data
+
+    async def get_snapshot(self) -> dict[str, Any]:
+        """
+        Return the current rate snapshot, going to the API only when it has expired.
+
+        Returns:
+            A dictionary containing the exchange rates and metadata.
+        """
+        if (
+            self._snapshot is not None
+            and time.time() - self._snapshot_time < self.cache_ttl
+        ):
+            return self._snapshot
+        return await self.fetch_currency_data()
+
+    def invalidate_cache(self) -> None:
+        """
+        Drop the cached snapshot so the next lookup fetches fresh data from the API.
+        """
+        self._snapshot = None
+        self._snapshot_time = 0.0
+
+    async def convert_from_usd(self, amount: float, target_currency: str) -> float:
+        """
+        Convert a given amount from USD to another specified currency.
+
+        Args:
+            amount: The amount in USD to be converted.
+            target_currency: The 3-letter code of the currency to convert to.
+
+        Returns:
+            The converted amount in the specified currency.
+
+        Raises:
+            ValueError: If the currency code is invalid.
+        """
+        rates = (await self.get_snapshot()).get("rates", {})
+
+        if target_currency not in rates:
+            raise ValueError(f"Currency '{target_currency}' not found in rate data.")
+
+        return amount * rates[target_currency]
+
+    async def convert_any_currency(
+        self, from_currency: str, to_currency: str, amount: float
+    ) -> float:
+        """
+        Convert an amount from one currency to another using the latest exchange rates.
+
+        Args:
+            from_currency: The 3-letter code of the currency to convert from.
+            to_currency: The 3-letter code of the currency to convert to.
+            amount: The amount to be converted.
+
+        Returns:
+            The converted amount in the target currency.
+
+        Raises:
+            ValueError: If either currency code is invalid.
+        """
+        rates = (await self.get_snapshot()).get("rates", {})
+
+        if from_currency not in rates or to_currency not in rates:
+            raise ValueError("The currency code you selected is not in our database.")
+
+        return amount / rates[from_currency] * rates[to_currency]
+
+    async def get_historical_rate(
+        self, date: str, base_currency: str
+    ) -> dict[str, Any]:
+        """
+        Get the historical exchange rate for a specific date.
+
+        The local historical store is read first, the API is only called for
+        dates that are not stored yet.
+
+        Args:
+            date: Date in YYYY-MM-DD format
+            base_currency: 3-letter currency code to fetch historical rates based on
+
+        Returns:
+            The historical exchange rates as a dictionary for a specific date
+        """
+        rates = await asyncio.to_thread(self.historical_store.get_rates, date)
+        if rates is None:
+            rates = (await self._fetch_missing_historical_rates([date])).get(date, {})
+
+        historical_rate_data = {"base": "USD", "rates": {}}
+        if base_currency in rates:
+            historical_rate_data["rates"][base_currency] = rates[base_currency]
+        return historical_rate_data
+
+    async def list_historical_rates_for_currency(
+        self, currency: str, days: int, end_date: str | None = None
+    ) -> list[tuple[str, float]]:
+        """
+        Get the trend of exchange rates for a currency over a specified number of days.
+
+        Missing days are requested concurrently, bounded by the connection pool.
+        Days the API has no rate for are left out.
+
+        Args:
+            currency: 3-letter currency code
+            days: Number of days to look back from end_date
+            end_date: Last date of the window in YYYY-MM-DD format, defaults to today
+
+        Returns:
+            A list of (date, rate) tuples ordered from the oldest date to end_date.
+
+        Raises:
+            ValueError: If days is negative or end_date is not a valid date.
+        """
+        if days < 0:
+            raise ValueError("The number of days can't be negative.")
+
+        last_date = Date.fromisoformat(end_date) if end_date else Date.today()
+        dates = [
+            (last_date - timedelta(days=offset)).isoformat()
+            for offset in range(days, -1, -1)
+        ]
+
+        fetched = await self._fetch_missing_historical_rates(dates)
+        column = await asyncio.to_thread(
+            self.historical_store.get_column, currency, dates[0], dates[-1]
+        )
+
+        historical_rates = []
+        for day, rate in zip(dates, column.tolist()):
+            if day in fetched:
+                rate = fetched[day].get(currency, float("nan"))
+            if not math.isnan(rate):
+                historical_rates.append((day, rate))
+
+        return historical_rates
+
+    async def _fetch_missing_historical_rates(
+        self, dates: list[str]
+    ) -> dict[str, dict[str, float]]:
+        # The store reads and rewrites its file, so it's used off the event loop.
+        missing = await asyncio.to_thread(self.historical_store.missing_dates, dates)
+        if not missing:
+            return {}
+
+        responses = await asyncio.gather(
+            *(
+                self._get_json(
+                    self.historical_api_url.format(date=day), no_data_ok=True
+                )
+                for day in missing
+            ),
+            return_exceptions=True,
+        )
+        fetched: dict[str, dict[str, float]] = {}
+        error: BaseException | None = None
+        for day, response in zip(missing, responses):
+            if isinstance(response, BaseException):
+                error = error or response
+            else:
+                fetched[day] = response.get("rates", {})
+
+        # Days that did arrive are kept even when others failed.
+        await asyncio.to_thread(self.historical_store.put_finished_days, fetched)
+        if error is not None:
+            raise error
+        return fetched
+
+    async def _get_json(self, url: str, no_data_ok: bool = False) -> dict[str, Any]:
+        # Callers asking for a URL that is already being fetched wait for that
+        # request instead of sending their own.
+        if url not in self._in_flight:
+            future = asyncio.ensure_future(self._request_json(url, no_data_ok))
+            self._in_flight[url] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(url, None))
+
+        return await asyncio.shield(self._in_flight[url])
+
+    async def _request_json(self, url: str, no_data_ok: bool = False) -> dict[str, Any]:
+        # With no_data_ok, a 400 or 404 means the API has nothing for the URL
+        # and is returned as an empty response; other errors always raise.
+        session = self._get_session()
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+            try:
+                async with session.get(url) as response:
+                    if response.status in _RETRY_STATUSES:
+                        if attempt < self.max_retries:
+                            continue
+                        raise ConnectionError("Failed to connect to server.")
+                    if no_data_ok and response.status in _NO_DATA_STATUSES:
+                        return {}
+                    if response.status >= 400:
+                        raise ConnectionError(
+                            f"Server answered with status {response.status}."
+                        )
+                    try:
+                        return await response.json(content_type=None)
+                    except ValueError as e:
+                        raise ConnectionError("Invalid response from server.") from e
+            except asyncio.TimeoutError as e:
+                if attempt == self.max_retries:
+                    raise TimeoutError("Server timed out error.") from e
+            except aiohttp.ClientError as e:
+                if attempt == self.max_retries:
+                    raise ConnectionError("Failed to connect to server.") from e
+
+        raise ConnectionError("Failed to connect to server.")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connect_timeout, read_timeout = self.timeout
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=connect_timeout, sock_read=read_timeout
+                ),
+                headers={"accept": "application/json"},
+            )
+        return self._session
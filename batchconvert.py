@@ -0,0 +1,281 @@
+import csv
+import itertools
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, TextIO
+
+import numpy as np
+
+from currencyhandler import CurrencyHandler
+
+INPUT_FIELDS = ("amount", "from", "to", "date")
+OUTPUT_FIELDS = INPUT_FIELDS + ("converted", "error")
+
+# Number of historical days kept in memory while a file is converted.
+_HISTORICAL_CACHE_SIZE = 64
+
+
+def read_records(
+    stream: TextIO, file_format: str = "csv"
+) -> Iterator[dict[str, Any]]:
+    """
+    Read conversion records from a CSV or JSONL stream, one at a time.
+
+    CSV input may start with a header row naming the columns, otherwise the
+    columns are taken as amount, from, to and an optional date. JSONL lines can
+    be objects with those keys or arrays in that order.
+
+    Args:
+        stream: Text stream to read from.
+        file_format: Either "csv" or "jsonl".
+
+    Yields:
+        One dictionary per record. Lines that can't be parsed are yielded as
+        {"error": ...} so the row count of the output matches the input.
+
+    Raises:
+        ValueError: If file_format is not supported.
+    """
+    if file_format == "jsonl":
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield {"error": "invalid record"}
+                continue
+            if isinstance(record, list):
+                record = dict(zip(INPUT_FIELDS, record))
+            if not isinstance(record, dict):
+                record = {"error": "invalid record"}
+            yield record
+
+    elif file_format == "csv":
+        fields = INPUT_FIELDS
+        first_row = True
+        for row in csv.reader(stream):
+            if not row:
+                continue
+            if first_row:
+                first_row = False
+                if not _is_number(row[0]):
+                    fields = tuple(column.strip().lower() for column in row)
+                    continue
+            yield dict(zip(fields, row))
+
+    else:
+        raise ValueError(f"Unsupported file format '{file_format}'.")
+
+
+def convert_records(
+    currency_handler: CurrencyHandler,
+    records: Iterable[dict[str, Any]],
+    chunk_size: int = 10000,
+) -> Iterator[dict[str, Any]]:
+    """
+    Convert a stream of records in fixed-size chunks.
+
+    Rows without a date are converted against one latest snapshot, taken when
+    the first chunk is converted and reused for the whole stream. Rows with a
+    date are converted against that day's historical rates. Rows whose day
+    can't be fetched get an error and the stream goes on; the day is asked for
+    again when a later chunk has it.
+
+    Args:
+        currency_handler: Handler used to get the rates.
+        records: Records as produced by read_records.
+        chunk_size: Number of records converted per vectorized pass.
+
+    Yields:
+        The input records with "converted" and "error" added, in input order.
+
+    Raises:
+        ConnectionError: If the latest rates are needed and can't be fetched.
+        TimeoutError: If the latest rates are needed and the API doesn't respond
+            in time.
+    """
+    latest_rates = None
+    historical_cache: OrderedDict[str, dict[str, float]] = OrderedDict()
+
+    records = iter(records)
+    while chunk := list(itertools.islice(records, chunk_size)):
+        if latest_rates is None:
+            latest_rates = currency_handler.get_snapshot().get("rates", {})
+        yield from _convert_chunk(
+            currency_handler, chunk, latest_rates, historical_cache
+        )
+
+
+def write_records(
+    stream: TextIO, records: Iterable[dict[str, Any]], file_format: str = "csv"
+) -> int:
+    """
+    Write converted records to a CSV or JSONL stream as they arrive.
+
+    Args:
+        stream: Text stream to write to.
+        records: Records as produced by convert_records.
+        file_format: Either "csv" or "jsonl".
+
+    Returns:
+        The number of records written.
+    """
+    count = 0
+    if file_format == "jsonl":
+        for record in records:
+            stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    else:
+        writer = csv.DictWriter(stream, OUTPUT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    return count
+
+
+def run_batch(
+    currency_handler: CurrencyHandler,
+    input_stream: TextIO,
+    output_stream: TextIO,
+    file_format: str = "csv",
+    chunk_size: int = 10000,
+) -> dict[str, float]:
+    """
+    Stream a whole file through read_records, convert_records and write_records.
+
+    Memory use depends on chunk_size only, not on the size of the input.
+
+    Args:
+        currency_handler: Handler used to get the rates.
+        input_stream: Text stream with CSV or JSONL records.
+        output_stream: Text stream the results are written to, in the same format.
+        file_format: Either "csv" or "jsonl".
+        chunk_size: Number of records converted per vectorized pass.
+
+    Returns:
+        A dictionary with the number of records, failed records, elapsed seconds
+        and records per second.
+    """
+    failed = 0
+
+    def count_failed(records: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        nonlocal failed
+        for record in records:
+            if record.get("error"):
+                failed += 1
+            yield record
+
+    start = time.perf_counter()
+    records = read_records(input_stream, file_format)
+    converted = convert_records(currency_handler, records, chunk_size)
+    count = write_records(output_stream, count_failed(converted), file_format)
+    seconds = time.perf_counter() - start
+
+    return {
+        "records": count,
+        "failed": failed,
+        "seconds": seconds,
+        "records_per_second": count / seconds if seconds else 0.0,
+    }
+
+
+def _convert_chunk(
+    currency_handler: CurrencyHandler,
+    chunk: list[dict[str, Any]],
+    latest_rates: dict[str, float],
+    historical_cache: OrderedDict[str, dict[str, float]],
+) -> list[dict[str, Any]]:
+    amounts = np.full(len(chunk), np.nan)
+    from_codes = np.full(len(chunk), "", dtype=object)
+    to_codes = np.full(len(chunk), "", dtype=object)
+    errors: list[str | None] = [record.get("error") for record in chunk]
+    rows_by_date: dict[str, list[int]] = {}
+
+    for row, record in enumerate(chunk):
+        if errors[row]:
+            continue
+        try:
+            amounts[row] = float(record["amount"])
+            from_codes[row] = str(record["from"]).strip().upper()
+            to_codes[row] = str(record["to"]).strip().upper()
+        except (KeyError, TypeError, ValueError):
+            errors[row] = "invalid record"
+            continue
+        day = str(record.get("date") or "").strip()
+        rows_by_date.setdefault(day, []).append(row)
+
+    unavailable = _load_historical_days(
+        currency_handler, list(rows_by_date), historical_cache
+    )
+
+    converted = np.full(len(chunk), np.nan)
+    for day, rows in rows_by_date.items():
+        if day in unavailable:
+            for row in rows:
+                errors[row] = f"rates for {day} unavailable: {unavailable[day]}"
+            continue
+        rates = historical_cache[day] if day else latest_rates
+        if not rates:
+            for row in rows:
+                errors[row] = f"no rates for {day or 'latest'}"
+            continue
+
+        converted[rows], invalid = currency_handler.convert_many(
+            amounts[rows], from_codes[rows], to_codes[rows], rates=rates
+        )
+        for row in np.asarray(rows)[invalid]:
+            errors[row] = "unknown currency"
+
+    results = []
+    for record, value, error in zip(chunk, converted.tolist(), errors):
+        result = dict(record)
+        result["converted"] = None if error else value
+        result["error"] = error
+        results.append(result)
+    return results
+
+
+def _load_historical_days(
+    currency_handler: CurrencyHandler,
+    days: list[str],
+    historical_cache: OrderedDict[str, dict[str, float]],
+) -> dict[str, str]:
+    # Returns the days that couldn't be fetched with the reason; they're left
+    # out of the cache so a later chunk tries them again.
+    for day in days:
+        if day in historical_cache:
+            historical_cache.move_to_end(day)
+
+    unavailable: dict[str, str] = {}
+    missing = [day for day in days if day and day not in historical_cache]
+    if missing:
+        try:
+            historical_cache.update(currency_handler.load_historical_rates(missing))
+        except ValueError:
+            # Malformed dates are loaded one by one so they don't fail the rest.
+            for day in missing:
+                try:
+                    historical_cache[day] = currency_handler.load_historical_rates(
+                        [day]
+                    )[day]
+                except ValueError:
+                    historical_cache[day] = {}
+                except (ConnectionError, TimeoutError) as e:
+                    unavailable[day] = str(e)
+        except (ConnectionError, TimeoutError) as e:
+            unavailable = dict.fromkeys(missing, str(e))
+
+    while len(historical_cache) > max(_HISTORICAL_CACHE_SIZE, len(days)):
+        historical_cache.popitem(last=False)
+    return unavailable
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
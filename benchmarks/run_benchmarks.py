@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date as Date
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+import numpy as np
+
+# The modules live at the top of the repository, so the suite also runs as
+# python benchmarks/run_benchmarks.py and not only with -m.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import CURRENCY_CODES, StubServer  # noqa: E402
+from currencyhandler import CurrencyHandler  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def measure(
+    operation: Callable[[], Any], repeat: int, items_per_call: int = 1
+) -> dict[str, float]:
+    """
+    Time an operation a number of times.
+
+    Args:
+        operation: Callable to time.
+        repeat: Number of calls.
+        items_per_call: Items handled per call, used for the throughput.
+
+    Returns:
+        Latency percentiles in milliseconds and throughput in items per second.
+    """
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - start)
+
+    latencies_ms = np.array(latencies) * 1000
+    total = float(np.sum(latencies))
+    return {
+        "calls": repeat,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p90_ms": float(np.percentile(latencies_ms, 90)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(np.max(latencies_ms)),
+        "throughput_per_s": repeat * items_per_call / total if total else 0.0,
+    }
+
+
+def run_suite(
+    server: StubServer, workdir: str, scale: float = 1.0
+) -> dict[str, dict[str, float]]:
+    """
+    Run every benchmark against a stub server.
+
+    Args:
+        server: Running stub server the handlers are pointed at.
+        workdir: Directory for the handlers' log and historical store files.
+        scale: Multiplier for the number of repetitions.
+
+    Returns:
+        A dictionary of benchmark name to its measurements.
+    """
+    rng = random.Random(1)
+
+    def new_handler(name: str) -> CurrencyHandler:
+        return CurrencyHandler(
+            api_base_url=server.base_url,
+            log_path=os.path.join(workdir, f"{name}.jsonl"),
+            history_path=os.path.join(workdir, f"{name}.bin"),
+        )
+
+    def pairs(count: int) -> list[tuple[str, str]]:
+        return [
+            (rng.choice(CURRENCY_CODES), rng.choice(CURRENCY_CODES))
+            for _ in range(count)
+        ]
+
+    results = {}
+    handler = new_handler("latest")
+
+    results["fetch_latest"] = measure(
+        lambda: handler.fetch_currency_data(), max(1, int(20 * scale))
+    )
+
+    single_pairs = iter(pairs(int(100000 * scale)))
+    results["convert_any_currency"] = measure(
+        lambda: handler.convert_any_currency(*next(single_pairs), 125.5),
+        int(100000 * scale),
+    )
+
+    batch_size = 100000
+    amounts = np.random.default_rng(1).uniform(1, 10000, batch_size)
+    batch_from, batch_to = (np.array(codes) for codes in zip(*pairs(batch_size)))
+    results["convert_many_100k"] = measure(
+        lambda: handler.convert_many(amounts, batch_from, batch_to),
+        max(1, int(20 * scale)),
+        items_per_call=batch_size,
+    )
+
+    minor_amounts = [int(amount * 100) for amount in amounts[:10000]]
+    results["convert_minor_units_many_10k"] = measure(
+        lambda: handler.convert_minor_units_many(
+            minor_amounts, batch_from[:10000], batch_to[:10000]
+        ),
+        max(1, int(5 * scale)),
+        items_per_call=len(minor_amounts),
+    )
+
+    first_day = Date(2020, 1, 1)
+    cold_days = iter(
+        (first_day + timedelta(days=offset)).isoformat()
+        for offset in range(int(200 * scale))
+    )
+    cold = new_handler("historical")
+    results["historical_cold"] = measure(
+        lambda: cold.get_historical_rate(next(cold_days), "SEK"), int(200 * scale)
+    )
+
+    warm_days = [
+        (first_day + timedelta(days=rng.randrange(int(200 * scale)))).isoformat()
+        for _ in range(int(2000 * scale))
+    ]
+    warm_days_iter = iter(warm_days)
+    results["historical_warm"] = measure(
+        lambda: cold.get_historical_rate(next(warm_days_iter), "SEK"),
+        len(warm_days),
+    )
+
+    trend_ends = iter(
+        (Date(2022, 1, 1) + timedelta(days=120 * offset)).isoformat()
+        for offset in range(max(1, int(5 * scale)))
+    )
+    trend = new_handler("trend")
+    results["trend_90d_cold"] = measure(
+        lambda: trend.list_historical_rates_for_currency(
+            "SEK", 90, end_date=next(trend_ends)
+        ),
+        max(1, int(5 * scale)),
+        items_per_call=91,
+    )
+    results["trend_90d_warm"] = measure(
+        lambda: trend.list_historical_rates_for_currency(
+            "SEK", 90, end_date="2022-01-01"
+        ),
+        max(1, int(50 * scale)),
+        items_per_call=91,
+    )
+
+    return results
+
+
+def print_results(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]] | None = None,
+) -> None:
+    """
+    Print the results as a table, with the change against a baseline if given.
+
+    Args:
+        results: Measurements from run_suite.
+        baseline: Measurements from an earlier run to compare with.
+    """
+    header = f"{'benchmark':<30}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+    header += f"{'items/s':>14}"
+    if baseline:
+        header += f"{'vs base':>10}"
+    print(header)
+
+    for name, result in results.items():
+        line = (
+            f"{name:<30}{result['p50_ms']:>10.3f}{result['p90_ms']:>10.3f}"
+            f"{result['p99_ms']:>10.3f}{result['throughput_per_s']:>14.0f}"
+        )
+        if baseline and name in baseline and baseline[name]["throughput_per_s"]:
+            speedup = result["throughput_per_s"] / baseline[name]["throughput_per_s"]
+            line += f"{speedup:>9.2f}x"
+        print(line)
+
+
+def main() -> None:
+    """
+    Run the benchmark suite and save the results.
+    """
+    parser = argparse.ArgumentParser(description="CurrencyHandler benchmarks")
+    parser.add_argument(
+        "--label",
+        default=datetime.now().strftime("%Y%m%d-%H%M%S"),
+        help="Name the results are saved under",
+    )
+    parser.add_argument("--compare", help="Results file to compare with")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiplier for the repetitions"
+    )
+    args = parser.parse_args()
+
+    server = StubServer(
+        latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate
+    ).start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            results = run_suite(server, workdir, args.scale)
+    finally:
+        server.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    results_path = os.path.join(RESULTS_DIR, f"{args.label}.json")
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "label": args.label,
+                "timestamp": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "stub": {
+                    "latency": args.latency,
+                    "jitter": args.jitter,
+                    "failure_rate": args.failure_rate,
+                    "requests": server.request_count,
+                    "failures": server.failure_count,
+                    "bytes_sent": server.bytes_sent,
+                },
+                "results": results,
+            },
+            f,
+            indent=4,
+        )
+    print(f"\nResults saved to {results_path}")
+
+
+if __name__ == "__main__":
+    main()
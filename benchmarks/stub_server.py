@@ -0,0 +1,204 @@
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date as Date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+# Real codes plus generated ones, about as many as the real API serves.
+CURRENCY_CODES = sorted(
+    ["USD", "EUR", "SEK", "GBP", "JPY", "NOK", "DKK", "CHF", "KWD", "BHD"]
+    + [f"Z{chr(65 + n // 26)}{chr(65 + n % 26)}" for n in range(160)]
+)
+
+
+class StubServer:
+    """
+    Local stand-in for the openexchangerates API.
+
+    Serves latest.json, currencies.json and historical/{date}.json with
+    deterministic rates, with optional added latency and injected failures.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: int = 1,
+    ):
+        """
+        Initialize the server. Call start to begin serving.
+
+        Args:
+            host: Interface to listen on.
+            port: Port to listen on, 0 picks a free one.
+            latency: Seconds added to every response.
+            jitter: Up to this many extra seconds added at random to every response.
+            failure_rate: Share of requests, from 0 to 1, answered with a 503.
+            seed: Seed for the generated rates and the injected failures.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.request_count = 0
+        self.failure_count = 0
+        self.bytes_sent = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._base_rates = {
+            code: round(self._random.uniform(0.05, 5000), 6) for code in CURRENCY_CODES
+        }
+        self._base_rates["USD"] = 1.0
+        self._latest = self._encode(self._payload(int(time.time())))
+        self._currencies = self._encode(
+            {code: f"Currency {code}" for code in CURRENCY_CODES}
+        )
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        """
+        URL to pass as api_base_url to CurrencyHandler.
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def start(self) -> "StubServer":
+        """
+        Start serving on a background thread.
+
+        Returns:
+            The server itself, for chaining.
+        """
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop serving and close the listening socket.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def historical_rates(self, day: str) -> dict[str, float]:
+        """
+        Rates the stub serves for a date, for checking results.
+
+        Args:
+            day: Date in YYYY-MM-DD format
+
+        Returns:
+            A dictionary of currency code to rate.
+        """
+        return self._payload(0, Date.fromisoformat(day).toordinal())["rates"]
+
+    def _payload(self, timestamp: int, ordinal: int = 0) -> dict[str, Any]:
+        # Rates drift a little from day to day so trends aren't flat.
+        drift = 1 + ((ordinal * 2654435761) % 1000 - 500) / 100000
+        return {
+            "disclaimer": "Local stub for benchmarks",
+            "license": "",
+            "timestamp": timestamp,
+            "base": "USD",
+            "rates": {
+                code: rate if code == "USD" else round(rate * drift, 6)
+                for code, rate in self._base_rates.items()
+            },
+        }
+
+    def _encode(self, payload: dict[str, Any]) -> bytes:
+        return json.dumps(payload).encode("utf-8")
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                with stub._lock:
+                    stub.request_count += 1
+                    failed = stub._random.random() < stub.failure_rate
+                    delay = stub.latency + stub._random.uniform(0, stub.jitter)
+                if delay:
+                    time.sleep(delay)
+
+                if failed:
+                    with stub._lock:
+                        stub.failure_count += 1
+                    self._send(503, b'{"error": true, "status": 503}')
+                    return
+
+                path = self.path.split("?", 1)[0]
+                if path.endswith("/latest.json"):
+                    if self.headers.get("If-None-Match") == '"latest"':
+                        self._send(304, b"")
+                    else:
+                        self._send(200, stub._latest, etag='"latest"')
+                elif path.endswith("/currencies.json"):
+                    self._send(200, stub._currencies)
+                elif "/historical/" in path:
+                    day = path.rsplit("/", 1)[-1].removesuffix(".json")
+                    try:
+                        ordinal = Date.fromisoformat(day).toordinal()
+                    except ValueError:
+                        self._send(400, b'{"error": true, "status": 400}')
+                        return
+                    self._send(200, stub._encode(stub._payload(0, ordinal)))
+                else:
+                    self._send(404, b'{"error": true, "status": 404}')
+
+            def _send(
+                self, status: int, body: bytes, etag: str | None = None
+            ) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+                with stub._lock:
+                    stub.bytes_sent += len(body)
+
+        return Handler
+
+
+def main() -> None:
+    """
+    Run the stub server in the foreground.
+    """
+    parser = argparse.ArgumentParser(description="Local openexchangerates stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubServer(
+        args.host, args.port, args.latency, args.jitter, args.failure_rate
+    ).start()
+    print(f"Serving on {server.base_url}, press Ctrl+C to stop.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
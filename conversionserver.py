@@ -0,0 +1,310 @@
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from currencyhandler import CurrencyHandler
+from upstream import QuotaExceededError
+
+# Largest request body accepted, enough for about a million bulk rows.
+MAX_BODY_BYTES = 64 * 1024 * 1024
+# Longest trend served, each missing day costs one upstream request.
+MAX_TREND_DAYS = 366
+
+
+class ConversionServer:
+    """
+    HTTP front end for one shared CurrencyHandler.
+
+    Every request is answered from the handler's cache, so any number of
+    clients share one set of upstream requests. Connections are kept alive and
+    each one is served on its own thread.
+
+    Endpoints, all answering JSON:
+        GET  /convert?from=SEK&to=EUR&amount=10[&date=YYYY-MM-DD]
+        POST /convert/bulk with {"amounts": [...], "from": ..., "to": ...}
+        GET  /rates
+        GET  /historical/YYYY-MM-DD
+        GET  /trend?currency=SEK&days=30[&end_date=YYYY-MM-DD], with statistics
+        GET  /metrics, in the Prometheus text format, when metrics are enabled
+    """
+
+    def __init__(
+        self,
+        handler: CurrencyHandler | None = None,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        background_refresh: bool = True,
+    ):
+        """
+        Initialize the server. Call start or serve_forever to begin serving.
+
+        Args:
+            handler: Handler all requests go through, a new one when left out.
+            host: Interface to listen on.
+            port: Port to listen on, 0 picks a free one.
+            background_refresh: Keep the latest rates renewed on a background
+                thread, so requests never wait on the API once they're loaded.
+        """
+        self.handler = handler if handler is not None else CurrencyHandler()
+        self.background_refresh = background_refresh
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        """
+        Base URL the server answers on.
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ConversionServer":
+        """
+        Start serving on a background thread.
+
+        Returns:
+            The server itself, for chaining.
+        """
+        if self.background_refresh:
+            self.handler.start_background_refresh()
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """
+        Serve on the calling thread until stop is called or it's interrupted.
+        """
+        if self.background_refresh:
+            self.handler.start_background_refresh()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.handler.stop_background_refresh()
+
+    def stop(self) -> None:
+        """
+        Stop serving, close the listening socket and stop the refresher.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self.handler.stop_background_refresh()
+
+    def _convert(self, query: dict[str, str]) -> dict[str, Any]:
+        from_currency, to_currency = _required(query, "from", "to")
+        amount = _number(_required(query, "amount")[0], "amount")
+        date = query.get("date")
+
+        if date is None:
+            rate = self.handler.get_cross_rate(from_currency, to_currency)
+        else:
+            rates = self.handler.get_historical_rates(date)
+            if from_currency not in rates or to_currency not in rates:
+                raise ValueError(
+                    "The currency code you selected is not in our database."
+                )
+            rate = rates[to_currency] / rates[from_currency]
+
+        converted = amount * rate
+        if not math.isfinite(converted):
+            raise ValueError("The converted amount is out of range.")
+        return {
+            "from": from_currency,
+            "to": to_currency,
+            "amount": amount,
+            "rate": rate,
+            "converted": converted,
+            "date": date,
+        }
+
+    def _convert_bulk(self, body: dict[str, Any]) -> dict[str, Any]:
+        # Every row is converted at the rates of the same snapshot or day.
+        if not isinstance(body, dict):
+            raise ValueError("The request body must be a JSON object.")
+        amounts = body.get("amounts")
+        from_currencies = body.get("from")
+        to_currencies = body.get("to")
+        if not isinstance(amounts, list) or not from_currencies or not to_currencies:
+            raise ValueError("'amounts', 'from' and 'to' are required.")
+        _check_codes(from_currencies, "from")
+        _check_codes(to_currencies, "to")
+
+        try:
+            amounts = np.asarray(amounts, dtype=np.float64)
+        except (TypeError, ValueError) as e:
+            raise ValueError("'amounts' must be a list of numbers.") from e
+
+        date = body.get("date")
+        if date is not None and not isinstance(date, str):
+            raise ValueError("'date' must be a date in YYYY-MM-DD format.")
+        if date is None:
+            snapshot = self.handler.get_snapshot()
+            rates = snapshot.get("rates", {})
+            as_of = {"timestamp": snapshot.get("timestamp")}
+        else:
+            rates = self.handler.get_historical_rates(date)
+            as_of = {"date": date}
+
+        converted, invalid = self.handler.convert_many(
+            amounts, from_currencies, to_currencies, rates=rates
+        )
+        values = converted.astype(object)
+        values[invalid | ~np.isfinite(converted)] = None
+        return {"converted": values.tolist(), "invalid": int(invalid.sum()), **as_of}
+
+    def _rates(self, query: dict[str, str]) -> dict[str, Any]:
+        snapshot = self.handler.get_snapshot()
+        return {
+            "base": snapshot.get("base", "USD"),
+            "timestamp": snapshot.get("timestamp"),
+            "age": self.handler.snapshot_age,
+            "rates": snapshot.get("rates", {}),
+        }
+
+    def _historical(self, date: str) -> dict[str, Any]:
+        return {
+            "base": "USD",
+            "date": date,
+            "rates": self.handler.get_historical_rates(date),
+        }
+
+    def _trend(self, query: dict[str, str]) -> dict[str, Any]:
+        (currency,) = _required(query, "currency")
+        days = int(_number(query.get("days", "30"), "days"))
+        if not 0 <= days <= MAX_TREND_DAYS:
+            raise ValueError(f"'days' must be between 0 and {MAX_TREND_DAYS}.")
+        series = self.handler.get_rate_series(
+            currency, days, end_date=query.get("end_date"), windows=(days + 1,)
+        )
+        stats = series.stats(days + 1)
+        return {
+            "currency": currency,
+            "rates": [{"date": day, "rate": rate} for day, rate in series],
+            "stats": stats if stats["count"] else None,
+        }
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                url = urlsplit(self.path)
+                query = {
+                    name: values[-1] for name, values in parse_qs(url.query).items()
+                }
+                path = url.path.rstrip("/")
+
+                if path == "/metrics":
+                    metrics = server.handler.metrics
+                    if metrics is None:
+                        self._send_error(404, "Metrics are not enabled.")
+                    else:
+                        body = metrics.to_prometheus().encode("utf-8")
+                        self._send(200, body, "text/plain; version=0.0.4")
+                elif path == "/convert":
+                    self._respond(server._convert, query)
+                elif path == "/rates":
+                    self._respond(server._rates, query)
+                elif path.startswith("/historical/"):
+                    self._respond(server._historical, path.rsplit("/", 1)[-1])
+                elif path == "/trend":
+                    self._respond(server._trend, query)
+                else:
+                    self._send_error(404, f"Unknown path '{url.path}'.")
+
+            def do_POST(self) -> None:
+                if urlsplit(self.path).path.rstrip("/") != "/convert/bulk":
+                    self._send_error(404, f"Unknown path '{self.path}'.")
+                    return
+
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                except ValueError:
+                    length = -1
+                if not 0 < length <= MAX_BODY_BYTES:
+                    self.close_connection = True
+                    self._send_error(
+                        413 if length > 0 else 411, "Invalid request body length."
+                    )
+                    return
+
+                try:
+                    body = json.loads(self.rfile.read(length))
+                except ValueError:
+                    self._send_error(400, "The request body is not valid JSON.")
+                    return
+                self._respond(server._convert_bulk, body)
+
+            def _respond(self, endpoint: Any, argument: Any) -> None:
+                try:
+                    body = json.dumps(endpoint(argument), allow_nan=False)
+                except ValueError as e:
+                    self._send_error(400, str(e))
+                except QuotaExceededError as e:
+                    self._send_error(429, str(e))
+                except TimeoutError as e:
+                    self._send_error(504, str(e))
+                except ConnectionError as e:
+                    self._send_error(502, str(e))
+                except Exception:
+                    # Anything else, e.g. a failed write of a cache file, still
+                    # gets an answer instead of a dropped connection.
+                    self._send_error(500, "Internal server error.")
+                else:
+                    self._send(200, body.encode("utf-8"))
+
+            def _send_error(self, status: int, message: str) -> None:
+                body = json.dumps({"error": message, "status": status})
+                self._send(status, body.encode("utf-8"))
+
+            def _send(
+                self,
+                status: int,
+                body: bytes,
+                content_type: str = "application/json",
+            ) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def _required(query: dict[str, str], *names: str) -> list[str]:
+    missing = [name for name in names if not query.get(name)]
+    if missing:
+        raise ValueError(f"Missing query parameter(s): {', '.join(missing)}.")
+    return [query[name] for name in names]
+
+
+def _check_codes(codes: Any, name: str) -> None:
+    if isinstance(codes, str):
+        return
+    if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+        raise ValueError(f"'{name}' must be a currency code or a list of them.")
+
+
+def _number(value: str, name: str) -> float:
+    try:
+        number = float(value)
+    except ValueError as e:
+        raise ValueError(f"'{name}' must be a number.") from e
+    if not math.isfinite(number):
+        raise ValueError(f"'{name}' must be a finite number.")
+    return number
@@ -1,35 +1,208 @@
+from __future__ import annotations
+
+import functools
+import itertools
 import json
-from datetime import datetime
-from typing import Any
+import operator
+import os
+import threading
+import time
+from datetime import date as Date
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
+
+from fixedpoint import (
+    DEFAULT_EXPONENT,
+    MINOR_UNIT_EXPONENTS,
+    ROUND_HALF_EVEN,
+    conversion_factor,
+    divide_rounded,
+    scale_rate,
+)
+from currencyindex import CurrencyIndex, resolve_codes
+from metrics import Metrics
+from providers import OpenExchangeRatesProvider, RateProvider, call_providers
+from snapshotlog import SnapshotLog
+from upstream import HIGH_PRIORITY, LOW_PRIORITY, RequestBudget, SingleFlight
+
+# numpy, requests and the modules built on numpy take most of the import time,
+# so they're imported where they're first needed. A one-off conversion from the
+# saved snapshot then never loads them.
+if TYPE_CHECKING:
+    import numpy as np
+
+    from asofrates import AsOfRateIndex
+    from historicalstore import HistoricalRateStore
+    from sharedrates import SharedRatePublisher
+    from timeseries import RateSeries
+
+
+def _timed(method: Callable) -> Callable:
+    # Records call latency per method; costs a single None check when the
+    # handler has no metrics.
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self: "CurrencyHandler", *args: Any, **kwargs: Any) -> Any:
+        metrics = self.metrics
+        if metrics is None:
+            return method(self, *args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            metrics.increment("currency_handler_errors_total", method=name)
+            raise
+        finally:
+            metrics.observe(
+                "currency_handler_call_seconds",
+                time.perf_counter() - start,
+                method=name,
+            )
+
+    return wrapper
+
+
+def _is_currency_names(names: Any) -> bool:
+    return (
+        isinstance(names, dict)
+        and bool(names)
+        and all(
+            isinstance(code, str) and isinstance(name, str)
+            for code, name in names.items()
+        )
+    )
+
+
+def _minor_units(amount: Any) -> int:
+    # Floats are turned down rather than truncated, since the point of minor
+    # units is that no rounding happens before the final one.
+    try:
+        return operator.index(amount)
+    except TypeError as e:
+        raise ValueError("Amounts in minor units must be integers.") from e
+
 
-import requests
+# Rate snapshot with its code index, rate array and cross-rate matrix.
+_RateIndex = tuple[dict[str, Any], dict[str, int], "np.ndarray", "np.ndarray"]
 
 
 class CurrencyHandler:
-    def __init__(self, base_currency: str = "USD"):
+    def __init__(
+        self,
+        base_currency: str = "USD",
+        cache_ttl: float = 3600,
+        log_path: str = "currency_log.jsonl",
+        max_workers: int = 8,
+        history_path: str = "historical_rates.bin",
+        timeout: tuple[float, float] = (3.05, 10),
+        max_retries: int = 3,
+        api_base_url: str = "https://openexchangerates.org/api",
+        metrics: Metrics | None = None,
+        request_budget: RequestBudget | None = None,
+        shared_rates: SharedRatePublisher | None = None,
+        metadata_ttl: float = 7 * 24 * 3600,
+        metadata_path: str = "currency_names.json",
+        offline: bool = False,
+        providers: list[RateProvider] | None = None,
+        hedge_after: float | None = None,
+    ):
         # You can only use "usd" as base in the API when using free tier.
         # Feel free to add more parameters if you have ideas on how
         # the class might benefit from that, making it more customizable.
         """
         Initialize the CurrencyHandler.
 
-        This constructor should:
-        1. Attempt to load currency data from a JSON file using the load_currency_data method.
-        2. If no JSON data is found or if it's outdated, fetch new data from the exchangerates API using the fetch_currency_data method.
-        3. Initialize any necessary instance variables for storing currency data and API information.
+        No currency data is loaded here. The first call that needs rates loads
+        them from the snapshot log with load_currency_data, or from the API with
+        fetch_currency_data if the file is missing or outdated.
 
-        # ADVICE: Start implementing the fetch_currency_data method
+        Args:
+            base_currency: 3-letter code of the base currency.
+            cache_ttl: Seconds a rate snapshot is considered fresh, both in memory
+                and in the JSON log file.
+            log_path: Path of the append-only log every fetched snapshot is
+                persisted to. A legacy currency_log.json next to it is still
+                read when the log is empty.
+            max_workers: Maximum number of historical requests run in parallel.
+            history_path: Path of the binary file historical rates are stored in.
+            timeout: Connect and read timeout in seconds for every API request
+                of the default provider.
+            max_retries: Number of retries, with exponential backoff, for failed
+                requests of the default provider before giving up.
+            api_base_url: Base URL of the openexchangerates API, e.g. a local
+                stand-in server for benchmarks. Only used by the default
+                provider.
+            metrics: Collector for call latencies, upstream requests, cache
+                hits and failed cache writes. Instrumentation is off when left
+                out.
+            request_budget: Limit on upstream requests per interval. Historical
+                fetches are low priority and are deferred or rejected first
+                when the budget runs low.
+            shared_rates: Shared memory table every new snapshot is published
+                to, for worker processes reading it with SharedRateReader.
+            metadata_ttl: Seconds the currency names are considered fresh.
+            metadata_path: Path of the JSON file the currency names are cached in.
+            offline: Never make a request. The last saved snapshot and names are
+                used however old they are, and only stored historical days are
+                available.
+            providers: Rate sources in order of preference. Errors from one
+                fall back to the next. Defaults to the openexchangerates API.
+            hedge_after: Seconds to wait for a provider before also asking the
+                next one, taking whichever answers first. Providers are only
+                asked one at a time when left out.
         """
-        self.app_id = "f33364a5d1c040b6b44597e443dfc1f4"
-        self.latest_api_url = (
-            f"https://openexchangerates.org/api/latest.json?app_id={self.app_id}"
-        )
-        self.currency_api_url = f"https://openexchangerates.org/api/currencies.json?prettyprint=false&show_alternative=false&show_inactive=false&app_id={self.app_id}"
+        if providers is None:
+            providers = [
+                OpenExchangeRatesProvider(
+                    api_base_url,
+                    timeout=timeout,
+                    max_retries=max_retries,
+                    pool_size=max_workers,
+                    metrics=metrics,
+                )
+            ]
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
         self.base_currency = base_currency
-        self.get_fetch_data = self.fetch_currency_data()
+        self.max_workers = max_workers
+        self.cache_ttl = cache_ttl
+        self.log_path = log_path
+        self.snapshot_log = SnapshotLog(log_path)
+        self.legacy_log_path = os.path.splitext(log_path)[0] + ".json"
+        self.history_path = history_path
+        self._historical_store: HistoricalRateStore | None = None
+        self.offline = offline
+        self._lazy_lock = threading.Lock()
+        self._snapshot: dict[str, Any] | None = None
+        self._snapshot_time = 0.0
+        self._snapshot_provider: RateProvider | None = None
+        self._skip_persisted = False
+        # (snapshot, code index, rate array, cross rates), replaced as a whole so
+        # readers always see the four from the same snapshot.
+        self._rate_index: _RateIndex | None = None
+        self._index_lock = threading.Lock()
+        self.minor_unit_exponents = dict(MINOR_UNIT_EXPONENTS)
+        # Snapshot with its fixed-point rates, replaced as one tuple.
+        self._scaled_rates: tuple[dict[str, Any], dict[str, int]] | None = None
+        self._refresh_thread: threading.Thread | None = None
+        self._stop_refresh = threading.Event()
+        self.last_refresh_error: Exception | None = None
+        self.request_budget = request_budget
+        self.shared_rates = shared_rates
+        self.metadata_ttl = metadata_ttl
+        self.metadata_path = metadata_path
+        self._currency_index: CurrencyIndex | None = None
+        self._currency_index_time = 0.0
+        self._single_flight = SingleFlight()
+        self.metrics = metrics
+        if metrics is not None:
+            self._register_gauges(metrics)
         self.tuples_list = []
         self.currency_log_data = []
 
+    @_timed
     def fetch_currency_data(self) -> dict[str, Any]:
         """
         Fetch the latest currency exchange rate data from the openexchangerates API.
@@ -40,21 +213,210 @@ class CurrencyHandler:
         3. Store the fetched data in the appropriate instance variable(s).
         4. Handle any potential errors or exceptions that may occur during the API request.
 
+        The request is conditional when a snapshot is already held, so unchanged
+        rates cost a 304 response and no body parse. Threads calling this while a
+        fetch is already running wait for that fetch instead of sending their own.
+
         Returns:
             A dictionary containing the latest exchange rates and metadata.
+
+        Raises:
+            ConnectionError: If the server can't be reached or the response is invalid.
+            TimeoutError: If the server doesn't respond in time.
+            QuotaExceededError: If the request budget is used up.
         """
-        headers = {"accept": "application/json"}
-        response = requests.get(self.latest_api_url, headers=headers)
+        return self._single_flight.do("latest", self._fetch_latest)
 
-        try:
-            fetch_data = response.json()
-        except ConnectionError:
-            raise ConnectionError("Failed to connect to server.")
-        except TimeoutError:
-            raise TimeoutError("Server timed out error.")
+    def _fetch_latest(self) -> dict[str, Any]:
+        snapshot = self._snapshot
+        snapshot_provider = self._snapshot_provider
+
+        def fetch(provider: RateProvider) -> dict[str, Any] | None:
+            # Only the provider the held snapshot came from can tell it's current.
+            conditional = snapshot is not None and provider is snapshot_provider
+            fetch_data = provider.fetch_latest(conditional=conditional)
+            if fetch_data is not None and "rates" not in fetch_data:
+                raise ConnectionError(f"No rates in the response from {provider.name}.")
+            return fetch_data
+
+        provider, fetch_data = self._call_providers("latest", fetch)
 
+        if fetch_data is None:
+            # Not modified, the held snapshot is still current.
+            self._store_snapshot(snapshot, time.time())
+            self._cache_snapshot()
+            return self._snapshot
+
+        self._snapshot_provider = provider
+        self._store_snapshot(fetch_data, time.time())
+        self._cache_snapshot()
         return fetch_data
 
+    def get_snapshot(self) -> dict[str, Any]:
+        """
+        Return the current rate snapshot, going to the API only when needed.
+
+        The in-memory snapshot is used while it is younger than cache_ttl. After
+        that the JSON log file is tried, and fetch_currency_data is only called
+        when the persisted snapshot is missing or expired as well.
+
+        While the background refresher is running an expired snapshot is returned
+        as is, since the refresher is already renewing it. If renewing a snapshot
+        fails, the last good snapshot keeps being served; see snapshot_age.
+
+        Returns:
+            A dictionary containing the exchange rates and metadata.
+
+        Raises:
+            ConnectionError: If no snapshot is held and the API can't be reached.
+            TimeoutError: If no snapshot is held and the API doesn't respond in time.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and (
+            self.offline
+            or self.is_refreshing
+            or not self._is_expired(self._snapshot_time)
+        ):
+            if self.metrics is not None:
+                self._record_cache("memory", hits=1)
+            return snapshot
+
+        if self.metrics is not None:
+            self._record_cache("memory", misses=1)
+
+        try:
+            return self.load_currency_data()
+        except (ConnectionError, TimeoutError) as e:
+            if snapshot is None:
+                raise
+            self.last_refresh_error = e
+            return snapshot
+
+    @property
+    def snapshot_age(self) -> float | None:
+        """
+        Seconds since the current snapshot was fetched, or None if none is loaded.
+        """
+        if self._snapshot is None:
+            return None
+        return time.time() - self._snapshot_time
+
+    @property
+    def is_refreshing(self) -> bool:
+        """
+        Whether the background refresher thread is running.
+        """
+        return self._refresh_thread is not None and self._refresh_thread.is_alive()
+
+    @property
+    def historical_store(self) -> HistoricalRateStore:
+        """
+        Local store of historical rates, opened on first use.
+        """
+        if self._historical_store is None:
+            from historicalstore import HistoricalRateStore
+
+            with self._lazy_lock:
+                if self._historical_store is None:
+                    self._historical_store = HistoricalRateStore(self.history_path)
+        return self._historical_store
+
+    def start_background_refresh(
+        self, refresh_ahead: float | None = None, retry_interval: float = 30
+    ) -> None:
+        """
+        Start a daemon thread that renews the snapshot before it expires.
+
+        Callers then always get the held snapshot right away and never wait on
+        the network, apart from the very first load if nothing is held yet.
+
+        Args:
+            refresh_ahead: Seconds before expiry the snapshot is renewed, defaults
+                to a tenth of cache_ttl.
+            retry_interval: Seconds to wait before retrying a failed refresh.
+        """
+        if self.is_refreshing:
+            return
+
+        if refresh_ahead is None:
+            refresh_ahead = self.cache_ttl / 10
+
+        self._stop_refresh.clear()
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_loop,
+            args=(refresh_ahead, retry_interval),
+            name="CurrencyHandler-refresh",
+            daemon=True,
+        )
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self) -> None:
+        """
+        Stop the background refresher thread and wait for it to finish.
+        """
+        self._stop_refresh.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join()
+            self._refresh_thread = None
+
+    def _refresh_loop(self, refresh_ahead: float, retry_interval: float) -> None:
+        wait = 0.0
+        while not self._stop_refresh.wait(wait):
+            age = self.snapshot_age
+            if age is not None and age < self.cache_ttl - refresh_ahead:
+                wait = self.cache_ttl - refresh_ahead - age
+                continue
+
+            try:
+                if self._snapshot is None:
+                    self.load_currency_data()
+                else:
+                    self.fetch_currency_data()
+                self.last_refresh_error = None
+            except OSError as e:
+                # Covers ConnectionError, TimeoutError and failed log writes.
+                self.last_refresh_error = e
+
+            age = self.snapshot_age
+            renewed = age is not None and age < self.cache_ttl - refresh_ahead
+            wait = 0.0 if renewed else retry_interval
+
+    def invalidate_cache(self) -> None:
+        """
+        Drop the cached snapshot so the next lookup fetches fresh data from the API.
+
+        The JSON log file is left in place, but it is ignored until a new snapshot
+        has been fetched.
+        """
+        self._snapshot = None
+        self._snapshot_time = 0.0
+        self._skip_persisted = True
+
+    def _is_expired(self, fetched_at: float) -> bool:
+        return time.time() - fetched_at >= self.cache_ttl
+
+    def _store_snapshot(self, snapshot: dict[str, Any], fetched_at: float) -> None:
+        self._snapshot = snapshot
+        self._snapshot_time = fetched_at
+        self._skip_persisted = False
+        if self.shared_rates is not None:
+            self.shared_rates.publish(snapshot.get("rates", {}), fetched_at)
+
+    def _save_snapshot(self) -> None:
+        try:
+            self.snapshot_log.append(self._snapshot, self._snapshot_time)
+        except OSError as e:
+            raise IOError(f"Failed to write {self.log_path}: {e}") from e
+
+    def _cache_snapshot(self) -> None:
+        # The log only saves a fetch on the next start, so a snapshot that
+        # can't be written is still returned from memory.
+        try:
+            self._save_snapshot()
+        except OSError:
+            self._record_write_failure("log_file")
+
+    @_timed
     def convert_from_usd(self, amount: float, target_currency: str) -> float:
         """
         Convert a given amount from USD to another specified currency.
@@ -71,7 +433,7 @@ class CurrencyHandler:
             ValueError: If the currency code is invalid or the amount is negative.
         """
 
-        rate_data = self.fetch_currency_data()
+        rate_data = self.get_snapshot()
 
         rates = rate_data.get("rates", {})
 
@@ -83,6 +445,7 @@ class CurrencyHandler:
 
         return rate_converter_data
 
+    @_timed
     def convert_any_currency(
         self, from_currency: str, to_currency: str, amount: float
     ) -> float:
@@ -105,42 +468,405 @@ class CurrencyHandler:
         self.to_currency = to_currency
         self.amount = amount
 
-        rate_converter_to_from_data = self.fetch_currency_data()
+        return amount * self.get_cross_rate(from_currency, to_currency)
+
+    def get_cross_rate(self, from_currency: str, to_currency: str) -> float:
+        """
+        Get the exchange rate between any two currencies in the current snapshot.
+
+        Args:
+            from_currency: The 3-letter code of the currency to convert from.
+            to_currency: The 3-letter code of the currency to convert to.
 
-        rates = rate_converter_to_from_data.get("rates", {})
+        Returns:
+            The number of to_currency units one from_currency unit buys.
 
+        Raises:
+            ValueError: If either currency code is invalid.
+        """
+        # A single pair is two dict lookups, the same division as the matrix
+        # entry, without building the matrix or loading numpy.
+        rates = self.get_snapshot().get("rates", {})
         if from_currency not in rates or to_currency not in rates:
             raise ValueError("The currency code you selected is not in our database.")
 
-        usd_amount = amount / rates[from_currency]
-        converted_amount = usd_amount * rates[to_currency]
+        return rates[to_currency] / rates[from_currency]
+
+    def get_cross_rate_matrix(self) -> tuple[list[str], np.ndarray]:
+        """
+        Get the full cross-rate matrix for the current snapshot.
+
+        The matrix is rebuilt only when a new snapshot arrives, from a copy of
+        the previous one when the set of codes is unchanged, so a matrix that was
+        handed out never changes. Entry [i, j] is the rate from codes[i] to
+        codes[j].
+
+        Returns:
+            A tuple of (codes, matrix) where matrix is a read-only N x N float64 array.
+        """
+        _, code_index, _, cross_rates = self._build_rate_index()
+
+        size = len(code_index)
+        return list(code_index), cross_rates[:size, :size]
+
+    @_timed
+    def convert_many(
+        self,
+        amounts: Any,
+        from_currencies: str | Any,
+        to_currencies: str | Any,
+        rates: dict[str, float] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Convert many amounts in one vectorized pass against a single rate snapshot.
+
+        Currency codes are resolved to integer indices once, so the cost per row
+        is a couple of array lookups instead of a method call and a dict lookup.
 
-        return converted_amount
+        Args:
+            amounts: Sequence or array of amounts to convert.
+            from_currencies: One 3-letter code for all rows, or one code per amount.
+            to_currencies: One 3-letter code for all rows, or one code per amount.
+            rates: USD based rates to convert with instead of the current snapshot,
+                for example a historical day from get_historical_rates.
+
+        Returns:
+            A tuple of (converted, invalid). converted holds the converted amounts
+            as float64 with NaN for rows that could not be converted, and invalid
+            is a boolean mask marking the rows with an unknown currency code.
 
-    def list_currencies(self) -> list[str]:
+        Raises:
+            ValueError: If the code arrays and the amounts have different lengths.
+        """
+        import numpy as np
+
+        if rates is None:
+            _, code_index, _, cross_rates = self._build_rate_index()
+        else:
+            code_index = {code: index for index, code in enumerate(rates)}
+            rate_array = self._to_rate_array(rates)
+
+        amounts = np.asarray(amounts, dtype=np.float64)
+        from_indices = resolve_codes(from_currencies, code_index, amounts.shape)
+        to_indices = resolve_codes(to_currencies, code_index, amounts.shape)
+
+        if rates is None:
+            converted = amounts * cross_rates[from_indices, to_indices]
+        else:
+            converted = amounts / rate_array[from_indices] * rate_array[to_indices]
+
+        unknown = len(code_index)
+        invalid = np.broadcast_to(
+            (from_indices == unknown) | (to_indices == unknown), converted.shape
+        )
+        return converted, invalid
+
+    @_timed
+    def convert_minor_units(
+        self,
+        from_currency: str,
+        to_currency: str,
+        amount: int,
+        rounding: str = ROUND_HALF_EVEN,
+    ) -> int:
+        """
+        Convert an amount exactly, using integer minor units such as cents or öre.
+
+        Rates are turned into fixed-point integers once per snapshot, so the
+        only rounding is the final one, done with the given rounding mode.
+
+        Args:
+            from_currency: The 3-letter code of the currency to convert from.
+            to_currency: The 3-letter code of the currency to convert to.
+            amount: The amount in minor units of from_currency.
+            rounding: A decimal module rounding mode, e.g. decimal.ROUND_HALF_UP.
+
+        Returns:
+            The converted amount in minor units of to_currency.
+
+        Raises:
+            ValueError: If either currency code or the rounding mode is invalid,
+                or the amount isn't an integer.
+        """
+        amount = _minor_units(amount)
+        factor = self._minor_unit_factor(from_currency, to_currency)
+        if factor is None:
+            raise ValueError("The currency code you selected is not in our database.")
+
+        numerator, denominator = factor
+        return divide_rounded(amount * numerator, denominator, rounding)
+
+    @_timed
+    def convert_minor_units_many(
+        self,
+        amounts: Any,
+        from_currencies: str | Any,
+        to_currencies: str | Any,
+        rounding: str = ROUND_HALF_EVEN,
+    ) -> list[int | None]:
+        """
+        Convert many amounts exactly, using integer minor units.
+
+        The conversion factor is worked out once per distinct currency pair.
+
+        Args:
+            amounts: Iterable of amounts in minor units.
+            from_currencies: One 3-letter code for all rows, or one code per amount.
+            to_currencies: One 3-letter code for all rows, or one code per amount.
+            rounding: A decimal module rounding mode, e.g. decimal.ROUND_HALF_UP.
+
+        Returns:
+            The converted amounts in minor units, None for rows with an unknown
+            currency code.
+
+        Raises:
+            ValueError: If the rounding mode is invalid or an amount isn't an
+                integer.
+        """
+        amounts = [_minor_units(amount) for amount in amounts]
+        if isinstance(from_currencies, str):
+            from_currencies = [from_currencies] * len(amounts)
+        if isinstance(to_currencies, str):
+            to_currencies = [to_currencies] * len(amounts)
+
+        factors: dict[tuple[str, str], tuple[int, int] | None] = {}
+        converted = []
+        for amount, from_currency, to_currency in zip(
+            amounts, from_currencies, to_currencies
+        ):
+            pair = (from_currency, to_currency)
+            if pair not in factors:
+                factors[pair] = self._minor_unit_factor(from_currency, to_currency)
+            factor = factors[pair]
+
+            if factor is None:
+                converted.append(None)
+            else:
+                converted.append(
+                    divide_rounded(amount * factor[0], factor[1], rounding)
+                )
+        return converted
+
+    def _minor_unit_factor(
+        self, from_currency: str, to_currency: str
+    ) -> tuple[int, int] | None:
+        snapshot = self.get_snapshot()
+        scaled = self._scaled_rates
+        if scaled is None or scaled[0] is not snapshot:
+            scaled = (
+                snapshot,
+                {
+                    code: scale_rate(rate)
+                    for code, rate in snapshot.get("rates", {}).items()
+                },
+            )
+            self._scaled_rates = scaled
+
+        scaled_rates = scaled[1]
+        if from_currency not in scaled_rates or to_currency not in scaled_rates:
+            return None
+
+        return conversion_factor(
+            scaled_rates[from_currency],
+            scaled_rates[to_currency],
+            self.minor_unit_exponents.get(from_currency, DEFAULT_EXPONENT),
+            self.minor_unit_exponents.get(to_currency, DEFAULT_EXPONENT),
+        )
+
+    def _build_rate_index(self) -> _RateIndex:
+        import numpy as np
+
+        snapshot = self.get_snapshot()
+        rate_index = self._rate_index
+        if rate_index is not None and rate_index[0] is snapshot:
+            return rate_index
+
+        with self._index_lock:
+            rate_index = self._rate_index
+            if rate_index is not None and rate_index[0] is snapshot:
+                return rate_index
+
+            rates = snapshot.get("rates", {})
+            rate_array = self._to_rate_array(rates)
+
+            if rate_index is not None and list(rates) == list(rate_index[1]):
+                code_index = rate_index[1]
+                cross_rates = self._update_cross_rates(
+                    rate_index[2], rate_index[3], rate_array
+                )
+            else:
+                code_index = {code: index for index, code in enumerate(rates)}
+                # Entry [i, j] converts from currency i to currency j.
+                cross_rates = rate_array[np.newaxis, :] / rate_array[:, np.newaxis]
+
+            rate_array.flags.writeable = False
+            cross_rates.flags.writeable = False
+            self._rate_index = (snapshot, code_index, rate_array, cross_rates)
+            return self._rate_index
+
+    def _to_rate_array(self, rates: dict[str, float]) -> np.ndarray:
+        import numpy as np
+
+        # The extra NaN slot is where unknown codes point to.
+        return np.append(
+            np.fromiter(rates.values(), dtype=np.float64, count=len(rates)), np.nan
+        )
+
+    def _update_cross_rates(
+        self,
+        previous_rates: np.ndarray,
+        previous_cross_rates: np.ndarray,
+        rate_array: np.ndarray,
+    ) -> np.ndarray:
+        import numpy as np
+
+        # Same codes as the previous snapshot, so only the rows and columns of
+        # the rates that moved need recomputing, on a copy since the previous
+        # matrix may still be in use.
+        changed = np.flatnonzero(rate_array[:-1] != previous_rates[:-1])
+        if len(changed) == 0:
+            return previous_cross_rates
+        if len(changed) > len(rate_array) // 4:
+            return rate_array[np.newaxis, :] / rate_array[:, np.newaxis]
+
+        cross_rates = previous_cross_rates.copy()
+        cross_rates[changed, :] = (
+            rate_array[np.newaxis, :] / rate_array[changed, np.newaxis]
+        )
+        cross_rates[:, changed] = (
+            rate_array[changed][np.newaxis, :] / rate_array[:, np.newaxis]
+        )
+        return cross_rates
+
+    @_timed
+    def list_currencies(self) -> list[tuple[str, str]]:
         """
         List all available currencies in alphabetical order.
         # BONUS - somehow get the full currency names, and include that as well. Feel free to do it any way you like.
 
         Returns:
-            A sorted list of available currency codes.
+            A sorted list of (code, full name) tuples.
+
+        Raises:
+            ConnectionError: If no names are cached and the API can't be reached.
+            TimeoutError: If no names are cached and the API doesn't respond in time.
+        """
+        currency_index = self.get_currency_index()
+        return sorted(currency_index.names.items())
+
+    def is_valid_currency(self, code: str) -> bool:
+        """
+        Check that a currency code exists, without a request once names are cached.
+
+        Args:
+            code: 3-letter currency code
+
+        Returns:
+            True if the code is a known currency.
         """
+        return code in self.get_currency_index()
 
-        headers = {"accept": "application/json"}
-        response = requests.get(self.currency_api_url, headers=headers)
+    def search_currencies(self, query: str, limit: int = 10) -> list[tuple[str, str]]:
+        """
+        Find currencies by code, start of the name or a fuzzy name match.
 
+        Args:
+            query: A code or part of a name, e.g. "SE", "swed" or "krona".
+            limit: Maximum number of results.
+
+        Returns:
+            A list of (code, full name) tuples, best match first.
+        """
+        currency_index = self.get_currency_index()
+        return [
+            (code, currency_index.names[code])
+            for code in currency_index.search(query, limit)
+        ]
+
+    def get_currency_index(self) -> CurrencyIndex:
+        """
+        Get the index of currency codes and names.
+
+        The names are kept in memory and in metadata_path for metadata_ttl
+        seconds, so they're only downloaded about once a week. Expired names
+        keep being used if downloading new ones fails.
+
+        Returns:
+            The current CurrencyIndex.
+
+        Raises:
+            ConnectionError: If no names are cached and the API can't be reached.
+            TimeoutError: If no names are cached and the API doesn't respond in time.
+        """
+        currency_index = self._currency_index
+        if (
+            currency_index is not None
+            and time.time() - self._currency_index_time < self.metadata_ttl
+        ):
+            return currency_index
+        return self._single_flight.do("currencies", self._load_currency_index)
+
+    def _load_currency_index(self) -> CurrencyIndex:
+        names = None
+        fetched_at = 0.0
         try:
-            currency_data = response.json()
-            for rate, complete_currency_name in currency_data.items():
-                print(f"{rate}: {complete_currency_name}")
-        except ConnectionError:
-            raise ConnectionError("Failed to connect to server.")
-        except TimeoutError:
-            raise TimeoutError("Server timed out error.")
-
-    def load_currency_data(
-        self, get_fetch_data: list[dict[str:Any]] = None
-    ) -> dict[str, Any]:
+            with open(self.metadata_path, encoding="utf-8") as f:
+                metadata = json.load(f)
+            names = metadata["currencies"]
+            fetched_at = float(metadata["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            names = None
+        if not _is_currency_names(names):
+            names = None
+
+        if names is None or time.time() - fetched_at >= self.metadata_ttl:
+
+            def fetch(provider: RateProvider) -> dict[str, str]:
+                # Anything but names counts as a failed download, so the next
+                # provider is asked and stale names are kept.
+                fetched = provider.fetch_currencies()
+                if not _is_currency_names(fetched):
+                    raise ConnectionError("Invalid currency names from server.")
+                return fetched
+
+            try:
+                _, fetched = self._call_providers("currencies", fetch)
+            except (ConnectionError, TimeoutError):
+                if names is None and self._currency_index is not None:
+                    names = self._currency_index.names
+                if names is None and self.offline:
+                    # Without saved names the codes of the snapshot still work.
+                    rates = self.get_snapshot().get("rates", {})
+                    names = {code: code for code in rates}
+                if names is None:
+                    raise
+                # Stale names are kept and the download is retried after a
+                # tenth of the TTL rather than on every lookup.
+                fetched_at = time.time() - self.metadata_ttl * 0.9
+            else:
+                names = fetched
+                fetched_at = time.time()
+                self._save_currency_names(names, fetched_at)
+
+        self._currency_index = CurrencyIndex(names)
+        self._currency_index_time = fetched_at
+        return self._currency_index
+
+    def _save_currency_names(self, names: dict[str, str], fetched_at: float) -> None:
+        try:
+            with open(self.metadata_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"fetched_at": fetched_at, "currencies": names},
+                    f,
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                )
+        except OSError:
+            # The names are only cached on disk to save a download on the next
+            # start, so they're still used from memory.
+            pass
+
+    def load_currency_data(self) -> dict[str, Any]:
         """
         Load currency data from a JSON file.
 
@@ -148,18 +874,53 @@ class CurrencyHandler:
         1. Check if a JSON file with saved currency data exists.
         2. If it exists, read and parse the JSON data.
         3. Check the timestamp of the saved data.
-        4. If the data is older than one hour, call fetch_currency_data to update it.
+        4. If the data is older than cache_ttl, call fetch_currency_data to update it.
         5. If no file exists or there's an error reading it, call fetch_currency_data.
 
+        The latest snapshot is rebuilt from the snapshot log, reading only from
+        its last keyframe on. A legacy currency_log.json is used while the log
+        is still empty.
+
         Returns:
             A dictionary containing the loaded (or fetched) currency data.
         """
 
-        if get_fetch_data == None:
-            self.get_fetch_data = []
-        else:
-            self.get_fetch_data = get_fetch_data
+        log_data = None
+        if not self._skip_persisted:
+            latest = self.snapshot_log.latest()
+            if latest is None:
+                latest = self._load_legacy_log()
+            if latest is not None:
+                log_data, saved_at = latest
+
+        missing = log_data is None or "rates" not in log_data
+        if self.offline and missing:
+            raise ConnectionError("Offline mode and no saved snapshot to use.")
+
+        # Offline, the saved snapshot is used however old it is.
+        if missing or (not self.offline and self._is_expired(saved_at)):
+            if self.metrics is not None:
+                self._record_cache("log_file", misses=1)
+            return self.fetch_currency_data()
 
+        if self.metrics is not None:
+            self._record_cache("log_file", hits=1)
+        self._store_snapshot(log_data, saved_at)
+        return log_data
+
+    def _load_legacy_log(self) -> tuple[dict[str, Any], float] | None:
+        # Snapshot written by earlier versions, a single pretty-printed JSON file.
+        if self.legacy_log_path == self.log_path:
+            return None
+        try:
+            with open(self.legacy_log_path, encoding="utf-8") as f:
+                log_data = json.load(f)
+            saved_at = datetime.fromisoformat(log_data["timestamp"]).timestamp()
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return log_data, saved_at
+
+    @_timed
     def export_to_json(self) -> None:
         """
         Export the current currency data (for the latest currencies) to a JSON file.
@@ -169,20 +930,24 @@ class CurrencyHandler:
         2. Write the JSON data to a file, including the current timestamp.
         3. Handle potential errors that may occur during file writing.
 
+        The snapshot is appended to the snapshot log at log_path, as a delta
+        against the previous snapshot between keyframes.
+
         Raises:
             IOError: If there's an error writing to the file, or a custom exception.
         #"""
-        timestamp_data = self.fetch_currency_data()
-        timestamp_data["timestamp"] = datetime.now().isoformat()
-
-        with open("currency_log.json", "w", encoding="utf-8") as f:
-            json.dump(timestamp_data, f, ensure_ascii=False, indent=4)
+        self.get_snapshot()
+        self._save_snapshot()
 
+    @_timed
     def get_historical_rate(self, date: str, base_currency: str) -> dict[str, Any]:
         """
         Get the historical exchange rate for a specific date using
         one of the relevant API-endpoints.
 
+        The local historical store is read first, the API is only called for
+        dates that are not stored yet.
+
         Args:
             date: Date in YYYY-MM-DD format
             base_currency: 3-letter currency code to fetch historical rates based on
@@ -193,44 +958,332 @@ class CurrencyHandler:
         """
         self.base_currency = base_currency
         self.date = date
-        url = f"https://openexchangerates.org/api/historical/{self.date}.json?app_id={self.app_id}&base=USD&symbols={self.base_currency}"
-        headers = {"accept": "application/json"}
-        response = requests.get(url, headers=headers)
-
-        try:
-            historical_rate_data = response.json()
-        except ConnectionError:
-            print("Failed to connect to server.")
-        except TimeoutError:
-            print("Server timed out error.")
+        rates = self.get_historical_rates(self.date)
 
+        historical_rate_data = {"base": "USD", "rates": {}}
+        if self.base_currency in rates:
+            historical_rate_data["rates"][self.base_currency] = rates[
+                self.base_currency
+            ]
         return historical_rate_data
 
+    def get_historical_rates(self, date: str) -> dict[str, float]:
+        """
+        Get the USD based rates of every currency for a specific date.
+
+        Args:
+            date: Date in YYYY-MM-DD format
+
+        Returns:
+            A dictionary of currency code to rate, empty if the API has no data
+            for the date.
+        """
+        return self.load_historical_rates([date])[date]
+
+    @_timed
+    def load_historical_rates(
+        self, dates: list[str], max_workers: int | None = None
+    ) -> dict[str, dict[str, float]]:
+        """
+        Get the USD based rates of every currency for several dates at once.
+
+        Stored dates are read from the local historical store and the missing
+        ones are fetched concurrently.
+
+        Args:
+            dates: Dates in YYYY-MM-DD format
+            max_workers: Cap on parallel requests, defaults to self.max_workers
+
+        Returns:
+            A dictionary of date to a dictionary of currency code to rate. Dates
+            the API has no data for map to an empty dictionary.
+        """
+        unique_dates = list(dict.fromkeys(dates))
+        fetched = self._fetch_missing_historical_rates(unique_dates, max_workers)
+
+        historical_rates = {}
+        for day in unique_dates:
+            if day in fetched:
+                historical_rates[day] = fetched[day]
+            else:
+                historical_rates[day] = self.historical_store.get_rates(day) or {}
+        return historical_rates
+
+    @_timed
     def list_historical_rates_for_currency(
-        self, currency: str, days: int
-    ) -> list[tuple[str, str]]:
+        self,
+        currency: str,
+        days: int,
+        end_date: str | None = None,
+        max_workers: int | None = None,
+    ) -> list[tuple[str, float]]:
         """
         Get the trend of exchange rates for a currency over a specified number of days.
 
+        Stored days are read from the local historical store. One historical
+        request is made per missing day, run concurrently on a bounded thread
+        pool. Days the API has no rate for are left out.
+
         Args:
             currency: 3-letter currency code
-            days: Number of days to look back
+            days: Number of days to look back from end_date
+            end_date: Last date of the window in YYYY-MM-DD format, defaults to today
+            max_workers: Cap on parallel requests, defaults to self.max_workers
 
         Returns:
-            A list of tuples, each containing a date and the corresponding rate
-            Tuples are typically used to store pairs of values.
+            A list of (date, rate) tuples ordered from the oldest date to end_date.
+
+        Raises:
+            ValueError: If days is negative or end_date is not a valid date.
         """
         self.currency = currency
         self.days = days
-        url = f"https://openexchangerates.org/api/historical/{self.days}.json?app_id={self.app_id}&base=USD&symbols={self.currency}"
-        headers = {"accept": "application/json"}
-        response = requests.get(url, headers=headers)
+        dates, column = self._historical_column(currency, days, end_date, max_workers)
+        # NaN marks days without a rate and is the only value unequal to itself.
+        return [
+            (day, rate) for day, rate in zip(dates, column.tolist()) if rate == rate
+        ]
+
+    @_timed
+    def get_rate_series(
+        self,
+        currency: str,
+        days: int,
+        end_date: str | None = None,
+        windows: tuple[int, ...] = (7, 30),
+        max_workers: int | None = None,
+    ) -> RateSeries:
+        """
+        Get the rates of a currency over a number of days as a compact series.
+
+        Loads the same days as list_historical_rates_for_currency, but keeps them
+        in arrays with rolling statistics instead of a list of tuples.
+
+        Args:
+            currency: 3-letter currency code
+            days: Number of days to look back from end_date
+            end_date: Last date of the window in YYYY-MM-DD format, defaults to today
+            windows: Sizes, in observations, of the rolling windows to maintain.
+            max_workers: Cap on parallel requests, defaults to self.max_workers
+
+        Returns:
+            A RateSeries ordered from the oldest date to end_date.
+
+        Raises:
+            ValueError: If days is negative or end_date is not a valid date.
+        """
+        from timeseries import RateSeries
+
+        dates, column = self._historical_column(currency, days, end_date, max_workers)
+        return RateSeries.from_column(currency, dates[0], column, windows)
+
+    def convert_as_of(
+        self,
+        records: Iterable[tuple[Any, Any, str, str]],
+        index: AsOfRateIndex | None = None,
+        chunk_size: int = 10000,
+        max_workers: int | None = None,
+    ) -> Iterator[tuple[Any, float | None, str | None]]:
+        """
+        Convert a stream of timestamped amounts at the rates in effect on their day.
+
+        Records are read in chunks. The distinct days of a chunk that aren't in
+        the index yet are loaded together with load_historical_rates, and each
+        record is then resolved to the last loaded day with rates at or before
+        its own. A year of transactions loads at most 365 days, however many
+        records there are.
+
+        Args:
+            records: (timestamp, amount, from, to) tuples. Timestamps can be Unix
+                times in seconds, datetimes, dates or ISO 8601 strings, and are
+                taken as UTC when they have no timezone.
+            index: Index to resolve the days with and add loaded days to, so it
+                can be reused across calls. A new one is used when left out.
+            chunk_size: Number of records resolved per vectorized pass.
+            max_workers: Cap on parallel requests, defaults to self.max_workers
+
+        Yields:
+            (record, converted, rate_date) tuples in input order. converted is
+            None for records that are malformed or have no rate for either
+            currency, and rate_date is the YYYY-MM-DD day whose rates were used.
+        """
+        import numpy as np
+
+        from asofrates import AsOfRateIndex, day_ordinal
+
+        if index is None:
+            index = AsOfRateIndex()
+
+        records = iter(records)
+        while chunk := list(itertools.islice(records, chunk_size)):
+            # Malformed records keep day 0, which never has rates.
+            ordinals = np.zeros(len(chunk), dtype=np.int64)
+            amounts = np.full(len(chunk), np.nan)
+            from_codes = np.full(len(chunk), "", dtype=object)
+            to_codes = np.full(len(chunk), "", dtype=object)
+            for row, record in enumerate(chunk):
+                try:
+                    timestamp, amount, from_currency, to_currency = record
+                    ordinals[row] = day_ordinal(timestamp)
+                    amounts[row] = float(amount)
+                    from_codes[row] = str(from_currency).strip().upper()
+                    to_codes[row] = str(to_currency).strip().upper()
+                except (TypeError, ValueError):
+                    ordinals[row] = 0
+
+            days = [
+                Date.fromordinal(ordinal)
+                for ordinal in np.unique(ordinals[ordinals > 0]).tolist()
+            ]
+            new_days = [day.isoformat() for day in days if day not in index]
+            if new_days:
+                index.update(self.load_historical_rates(new_days, max_workers))
+
+            converted, invalid, rate_dates = index.convert_ordinals(
+                ordinals, amounts, from_codes, to_codes
+            )
+            # Each distinct day is formatted once rather than once per record.
+            labels, label_rows = np.unique(rate_dates, return_inverse=True)
+            labels = [str(label) for label in labels]
+            failed = invalid | np.isnan(converted)
+            for record, value, is_failed, label_row in zip(
+                chunk, converted.tolist(), failed.tolist(), label_rows.tolist()
+            ):
+                if is_failed:
+                    yield record, None, None
+                else:
+                    yield record, value, labels[label_row]
+
+    def _historical_column(
+        self,
+        currency: str,
+        days: int,
+        end_date: str | None,
+        max_workers: int | None,
+    ) -> tuple[list[str], np.ndarray]:
+        if days < 0:
+            raise ValueError("The number of days can't be negative.")
+
+        last_date = Date.fromisoformat(end_date) if end_date else Date.today()
+        dates = [
+            (last_date - timedelta(days=offset)).isoformat()
+            for offset in range(days, -1, -1)
+        ]
 
+        fetched = self._fetch_missing_historical_rates(dates, max_workers)
+        column = self.historical_store.get_column(currency, dates[0], dates[-1])
+        for offset, day in enumerate(dates):
+            if day in fetched:
+                column[offset] = fetched[day].get(currency, float("nan"))
+        return dates, column
+
+    def _fetch_missing_historical_rates(
+        self, dates: list[str], max_workers: int | None = None
+    ) -> dict[str, dict[str, float]]:
+        missing = self.historical_store.missing_dates(dates)
+        if self.metrics is not None:
+            self._record_cache(
+                "historical", hits=len(dates) - len(missing), misses=len(missing)
+            )
+        if not missing or self.offline:
+            return {}
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        workers = min(max_workers or self.max_workers, len(missing))
+        fetched: dict[str, dict[str, float]] = {}
+        error: Exception | None = None
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                (day, executor.submit(self._fetch_historical_data, day))
+                for day in missing
+            ]
+            for day, future in futures:
+                try:
+                    fetched[day] = future.result().get("rates", {})
+                except (ConnectionError, TimeoutError) as e:
+                    error = error or e
+
+        # Days that did arrive are kept even when others failed, e.g. when the
+        # request budget turned down the rest, so their requests aren't wasted.
+        # The store is a cache, so rates it can't take are still returned.
         try:
-            list_of_historical_rate_data = response.json()
-        except ConnectionError:
-            raise ConnectionError("Failed to connect to server.")
-        except TimeoutError:
-            raise TimeoutError("Server timed out error.")
+            self.historical_store.put_finished_days(fetched)
+        except OSError:
+            self._record_write_failure("historical")
+        if error is not None:
+            raise error
+        return fetched
+
+    def _fetch_historical_data(self, date: str) -> dict[str, Any]:
+        return self._single_flight.do(
+            ("historical", date),
+            lambda: self._call_providers(
+                "historical",
+                lambda provider: provider.fetch_historical(date),
+                priority=LOW_PRIORITY,
+            )[1],
+        )
+
+    def _call_providers(
+        self,
+        endpoint: str,
+        call: Callable[[RateProvider], Any],
+        priority: str = HIGH_PRIORITY,
+    ) -> tuple[RateProvider, Any]:
+        if self.offline:
+            raise ConnectionError("Offline mode, no requests are made.")
+
+        def attempt(provider: RateProvider) -> Any:
+            # Hedged requests count against the budget like any other.
+            if provider.remote and self.request_budget is not None:
+                try:
+                    self.request_budget.acquire(priority)
+                except ConnectionError:
+                    if self.metrics is not None:
+                        self.metrics.increment(
+                            "currency_handler_budget_rejected_total",
+                            endpoint=endpoint,
+                        )
+                    raise
+            return call(provider)
+
+        return call_providers(self.providers, attempt, self.hedge_after, self.metrics)
+
+    def _register_gauges(self, metrics: Metrics) -> None:
+        metrics.register_gauge(
+            "currency_handler_snapshot_age_seconds", lambda: self.snapshot_age
+        )
+        for cache in ("memory", "log_file", "historical"):
+            metrics.register_gauge(
+                "currency_handler_cache_hit_ratio",
+                functools.partial(self._cache_hit_ratio, metrics, cache),
+                cache=cache,
+            )
+
+    def _cache_hit_ratio(self, metrics: Metrics, cache: str) -> float | None:
+        hits = metrics.get_counter(
+            "currency_handler_cache_total", cache=cache, result="hit"
+        )
+        misses = metrics.get_counter(
+            "currency_handler_cache_total", cache=cache, result="miss"
+        )
+        if hits + misses == 0:
+            return None
+        return hits / (hits + misses)
+
+    def _record_write_failure(self, cache: str) -> None:
+        if self.metrics is not None:
+            self.metrics.increment(
+                "currency_handler_cache_write_failures_total", cache=cache
+            )
 
-        return list_of_historical_rate_data
+    def _record_cache(self, cache: str, hits: int = 0, misses: int = 0) -> None:
+        if hits:
+            self.metrics.increment(
+                "currency_handler_cache_total", hits, cache=cache, result="hit"
+            )
+        if misses:
+            self.metrics.increment(
+                "currency_handler_cache_total", misses, cache=cache, result="miss"
+            )
@@ -0,0 +1,196 @@
+import bisect
+from typing import Any
+
+
+class CurrencyIndex:
+    """
+    In-memory index of currency codes and names for validation and search.
+
+    Holds the set of codes for O(1) validation, sorted codes and a sorted list
+    of lowercased names and name words for prefix search with bisect, and a map
+    from name trigrams to codes for fuzzy matching, e.g. "swed" finds SEK.
+    """
+
+    def __init__(self, names: dict[str, str]):
+        """
+        Build the index.
+
+        Args:
+            names: Full currency names keyed by 3-letter code, as served by the
+                currencies endpoint.
+        """
+        self.names = dict(names)
+        self.codes = frozenset(names)
+        self._sorted_codes = sorted(names)
+
+        # One entry per name and per word in it, so "krona" finds SEK as well.
+        prefixes = set()
+        for code, name in self.names.items():
+            lowered = name.lower()
+            prefixes.add((lowered, code))
+            for word in lowered.split()[1:]:
+                prefixes.add((word, code))
+        self._prefixes = sorted(prefixes)
+
+        self._trigrams: dict[str, set[str]] = {}
+        for code, name in self.names.items():
+            for trigram in _trigrams(name):
+                self._trigrams.setdefault(trigram, set()).add(code)
+
+    def __contains__(self, code: object) -> bool:
+        return code in self.codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def name(self, code: str) -> str | None:
+        """
+        Get the full name of a currency.
+
+        Args:
+            code: 3-letter currency code
+
+        Returns:
+            The name, or None if the code is unknown.
+        """
+        return self.names.get(code)
+
+    def prefix_search(self, prefix: str, limit: int = 10) -> list[str]:
+        """
+        Find currencies whose name, or a word in it, starts with a prefix.
+
+        Args:
+            prefix: Start of a name, in any case.
+            limit: Maximum number of codes returned.
+
+        Returns:
+            Matching codes, ordered by the matched name.
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        matches: list[str] = []
+        position = bisect.bisect_left(self._prefixes, (prefix, ""))
+        while position < len(self._prefixes) and len(matches) < limit:
+            key, code = self._prefixes[position]
+            if not key.startswith(prefix):
+                break
+            if code not in matches:
+                matches.append(code)
+            position += 1
+        return matches
+
+    def fuzzy_search(
+        self, query: str, limit: int = 5, min_score: float = 0.5
+    ) -> list[str]:
+        """
+        Find currencies whose name shares most of the trigrams of a query.
+
+        Args:
+            query: Part of a name, possibly misspelled.
+            limit: Maximum number of codes returned.
+            min_score: Share of the query's trigrams, from 0 to 1, a name must
+                contain to match.
+
+        Returns:
+            Matching codes, best match first.
+        """
+        query_trigrams = _trigrams(query)
+        if not query_trigrams:
+            return []
+
+        shared: dict[str, int] = {}
+        for trigram in query_trigrams:
+            for code in self._trigrams.get(trigram, ()):
+                shared[code] = shared.get(code, 0) + 1
+
+        threshold = min_score * len(query_trigrams)
+        # Ties go to the shorter name, where the query covers more of it.
+        ranked = sorted(
+            (code for code, count in shared.items() if count >= threshold),
+            key=lambda code: (-shared[code], len(self.names[code]), code),
+        )
+        return ranked[:limit]
+
+    def search(self, query: str, limit: int = 10) -> list[str]:
+        """
+        Find currencies by code, name prefix or fuzzy name match, in that order.
+
+        Args:
+            query: A code, or part of a name.
+            limit: Maximum number of codes returned.
+
+        Returns:
+            Matching codes, best match first.
+        """
+        code_prefix = query.strip().upper()
+        matches = []
+        if 0 < len(code_prefix) <= 3:
+            # Sorted codes put an exact match first, then longer codes.
+            position = bisect.bisect_left(self._sorted_codes, code_prefix)
+            while position < len(self._sorted_codes):
+                code = self._sorted_codes[position]
+                if not code.startswith(code_prefix):
+                    break
+                matches.append(code)
+                position += 1
+
+        for code in self.prefix_search(query, limit) + self.fuzzy_search(query, limit):
+            if code not in matches:
+                matches.append(code)
+        return matches[:limit]
+
+
+def resolve_codes(
+    currencies: str | Any,
+    code_index: dict[str, int],
+    shape: tuple[int, ...] | None = None,
+) -> Any:
+    """
+    Turn currency codes into positions in a rate array.
+
+    Each distinct code is looked up once, so a million rows with a handful of
+    currencies cost a handful of dict lookups. Unknown codes map to
+    len(code_index), the slot rate arrays keep NaN in.
+
+    Args:
+        currencies: One 3-letter code, or a sequence of codes.
+        code_index: Position of every known code.
+        shape: Shape of the amounts the codes belong to. A sequence of codes
+            must then have one code per amount.
+
+    Returns:
+        An int for a single code, or an array of positions.
+
+    Raises:
+        ValueError: If a sequence of codes doesn't match shape.
+    """
+    import numpy as np
+
+    unknown = len(code_index)
+    if isinstance(currencies, str):
+        return code_index.get(currencies, unknown)
+
+    # Checked here, since broadcasting would stretch a single code to any
+    # number of amounts, or a single amount to any number of codes.
+    if shape is not None and shape != (len(currencies),):
+        raise ValueError("Amounts and currency codes must have the same length.")
+
+    unique_codes, inverse = np.unique(
+        np.asarray(currencies, dtype=str), return_inverse=True
+    )
+    unique_indices = np.array(
+        [code_index.get(code, unknown) for code in unique_codes], dtype=np.intp
+    )
+    return unique_indices[inverse]
+
+
+def _trigrams(text: str) -> set[str]:
+    # Words get a leading space so matches at the start of a word count more,
+    # but no trailing one, since queries are often the start of a word.
+    trigrams = set()
+    for word in text.lower().split():
+        padded = " " + word
+        trigrams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return trigrams
@@ -0,0 +1,145 @@
+from decimal import (
+    ROUND_CEILING,
+    ROUND_DOWN,
+    ROUND_FLOOR,
+    ROUND_HALF_DOWN,
+    ROUND_HALF_EVEN,
+    ROUND_HALF_UP,
+    ROUND_UP,
+    Decimal,
+)
+
+# ISO 4217 minor unit exponents that differ from the usual two decimals.
+MINOR_UNIT_EXPONENTS = {
+    "BIF": 0,
+    "CLP": 0,
+    "DJF": 0,
+    "GNF": 0,
+    "ISK": 0,
+    "JPY": 0,
+    "KMF": 0,
+    "KRW": 0,
+    "PYG": 0,
+    "RWF": 0,
+    "UGX": 0,
+    "UYI": 0,
+    "VND": 0,
+    "VUV": 0,
+    "XAF": 0,
+    "XOF": 0,
+    "XPF": 0,
+    "BHD": 3,
+    "IQD": 3,
+    "JOD": 3,
+    "KWD": 3,
+    "LYD": 3,
+    "OMR": 3,
+    "TND": 3,
+    "CLF": 4,
+    "UYW": 4,
+    "BTC": 8,
+}
+DEFAULT_EXPONENT = 2
+
+# Rates are stored as integers in units of 10**-RATE_DECIMALS.
+RATE_DECIMALS = 18
+
+ROUNDING_MODES = (
+    ROUND_HALF_EVEN,
+    ROUND_HALF_UP,
+    ROUND_HALF_DOWN,
+    ROUND_DOWN,
+    ROUND_UP,
+    ROUND_FLOOR,
+    ROUND_CEILING,
+)
+
+
+def scale_rate(rate: float) -> int:
+    """
+    Turn a rate from the API into a fixed-point integer.
+
+    The rate is read as the decimal number it was written as in the JSON payload,
+    not as its binary float value.
+
+    Args:
+        rate: Rate as parsed from the API response.
+
+    Returns:
+        The rate in units of 10**-RATE_DECIMALS.
+    """
+    return int(
+        Decimal(repr(rate)).scaleb(RATE_DECIMALS).to_integral_value(ROUND_HALF_EVEN)
+    )
+
+
+def conversion_factor(
+    from_rate: int, to_rate: int, from_exponent: int, to_exponent: int
+) -> tuple[int, int]:
+    """
+    Build the exact factor that converts minor units of one currency into another.
+
+    Args:
+        from_rate: Fixed-point USD rate of the currency converted from.
+        to_rate: Fixed-point USD rate of the currency converted to.
+        from_exponent: Minor unit exponent of the currency converted from.
+        to_exponent: Minor unit exponent of the currency converted to.
+
+    Returns:
+        A (numerator, denominator) pair; the converted amount is
+        amount * numerator / denominator.
+    """
+    numerator = to_rate
+    denominator = from_rate
+    if to_exponent >= from_exponent:
+        numerator *= 10 ** (to_exponent - from_exponent)
+    else:
+        denominator *= 10 ** (from_exponent - to_exponent)
+    return numerator, denominator
+
+
+def divide_rounded(
+    numerator: int, denominator: int, rounding: str = ROUND_HALF_EVEN
+) -> int:
+    """
+    Divide two integers and round the exact quotient to an integer.
+
+    Args:
+        numerator: Integer to divide.
+        denominator: Non-zero integer to divide by.
+        rounding: One of the decimal module rounding modes in ROUNDING_MODES.
+
+    Returns:
+        The rounded quotient.
+
+    Raises:
+        ValueError: If the rounding mode is not supported.
+        ZeroDivisionError: If denominator is zero.
+    """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"Unsupported rounding mode '{rounding}'.")
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+
+    quotient, remainder = divmod(numerator, denominator)
+    if remainder == 0 or rounding == ROUND_FLOOR:
+        return quotient
+    if rounding == ROUND_CEILING:
+        return quotient + 1
+    if rounding == ROUND_DOWN:
+        return quotient + 1 if numerator < 0 else quotient
+    if rounding == ROUND_UP:
+        return quotient if numerator < 0 else quotient + 1
+
+    twice_remainder = 2 * remainder
+    if twice_remainder < denominator:
+        return quotient
+    if twice_remainder > denominator:
+        return quotient + 1
+
+    # Exactly halfway between quotient and quotient + 1.
+    if rounding == ROUND_HALF_EVEN:
+        return quotient + (quotient & 1)
+    if rounding == ROUND_HALF_UP:
+        return quotient if numerator < 0 else quotient + 1
+    return quotient + 1 if numerator < 0 else quotient
@@ -0,0 +1,315 @@
+import os
+import struct
+import threading
+from datetime import date as Date
+from datetime import datetime, timezone
+from typing import Any
+
+import numpy as np
+
+# Header: magic, ordinal of the first row's date, number of currency columns.
+# It is followed by one 8-byte ASCII name per column, then the float64 rows.
+_MAGIC = b"CHRATES1"
+_HEADER = struct.Struct("<8sqq")
+_CODE_WIDTH = 8
+_ALIGNMENT = 64
+
+
+class HistoricalRateStore:
+    """
+    Local store of historical USD based rates keyed by (date, currency).
+
+    The data lives in one fixed-width binary file laid out column-wise: one row
+    per day and one float64 column per currency, with NaN where no rate is known.
+    Reads go through a memory map, so looking up a long range only touches the
+    pages that are needed and no JSON has to be parsed.
+    """
+
+    def __init__(self, path: str = "historical_rates.bin"):
+        """
+        Initialize the store.
+
+        Args:
+            path: Path of the binary file. It is created on the first write.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        # Replaced as a whole, never modified, so a reader that took it once
+        # sees one consistent layout even while a write remaps the file.
+        self._map = _StoreMap()
+
+    def get_rates(self, date: str) -> dict[str, float] | None:
+        """
+        Get all stored rates for a date.
+
+        Args:
+            date: Date in YYYY-MM-DD format
+
+        Returns:
+            A dictionary of currency code to rate, or None if the date is not stored.
+        """
+        store_map = self._current_map()
+        row = store_map.row(Date.fromisoformat(date).toordinal())
+        if row is None or np.isnan(row).all():
+            return None
+
+        return {
+            code: float(rate)
+            for code, rate in zip(store_map.codes, row)
+            if not np.isnan(rate)
+        }
+
+    def get_column(self, currency: str, start_date: str, end_date: str) -> np.ndarray:
+        """
+        Get the stored rates for one currency over a range of dates.
+
+        Args:
+            currency: 3-letter currency code
+            start_date: First date in YYYY-MM-DD format
+            end_date: Last date in YYYY-MM-DD format, inclusive
+
+        Returns:
+            A float64 array with one value per day, NaN for days without a rate.
+        """
+        start = Date.fromisoformat(start_date).toordinal()
+        end = Date.fromisoformat(end_date).toordinal()
+        column = np.full(max(end - start + 1, 0), np.nan)
+
+        store_map = self._current_map()
+        if currency not in store_map.columns or len(column) == 0:
+            return column
+
+        first_ordinal = store_map.first_ordinal
+        first = max(start, first_ordinal)
+        last = min(end, first_ordinal + len(store_map.rows) - 1)
+        if first <= last:
+            column[first - start : last - start + 1] = store_map.rows[
+                first - first_ordinal : last - first_ordinal + 1,
+                store_map.columns[currency],
+            ]
+        return column
+
+    def missing_dates(self, dates: list[str]) -> list[str]:
+        """
+        Filter a list of dates down to the ones that are not stored.
+
+        Args:
+            dates: Dates in YYYY-MM-DD format
+
+        Returns:
+            The dates from the input that have no stored rates, in input order.
+        """
+        store_map = self._current_map()
+        missing = []
+        for day in dates:
+            row = store_map.row(Date.fromisoformat(day).toordinal())
+            if row is None or np.isnan(row).all():
+                missing.append(day)
+        return missing
+
+    def put_rates(self, date: str, rates: dict[str, float]) -> None:
+        """
+        Store the rates for a single date.
+
+        Args:
+            date: Date in YYYY-MM-DD format
+            rates: Dictionary of currency code to rate
+        """
+        self.put_many({date: rates})
+
+    def put_finished_days(self, rates_by_date: dict[str, dict[str, float]]) -> None:
+        """
+        Store fetched rates, leaving out days that aren't over yet.
+
+        Rates for the current UTC day can still change, and days the API had no
+        data for are left out so they're requested again later.
+
+        Args:
+            rates_by_date: Dictionary of YYYY-MM-DD date to a dictionary of
+                currency code to rate, as fetched from the API.
+
+        Raises:
+            IOError: If the file can't be written.
+        """
+        today = datetime.now(timezone.utc).date().isoformat()
+        self.put_many(
+            {
+                day: rates
+                for day, rates in rates_by_date.items()
+                if rates and day < today
+            }
+        )
+
+    def put_many(self, rates_by_date: dict[str, dict[str, float]]) -> None:
+        """
+        Store rates for several dates with a single pass over the file.
+
+        Args:
+            rates_by_date: Dictionary of YYYY-MM-DD date to a dictionary of
+                currency code to rate.
+
+        Raises:
+            IOError: If the file can't be written.
+        """
+        if not rates_by_date:
+            return
+
+        ordinals = {
+            Date.fromisoformat(day).toordinal(): rates
+            for day, rates in rates_by_date.items()
+        }
+
+        with self._lock:
+            store_map = self._current_map()
+            codes = store_map.codes + sorted(
+                {code for rates in ordinals.values() for code in rates}
+                - set(store_map.columns)
+            )
+            first_ordinal = min(ordinals)
+            if store_map.codes:
+                first_ordinal = min(first_ordinal, store_map.first_ordinal)
+
+            try:
+                if (
+                    codes != store_map.codes
+                    or first_ordinal != store_map.first_ordinal
+                ):
+                    store_map = self._rewrite(store_map, first_ordinal, codes)
+                self._write_rows(store_map, ordinals)
+            except OSError as e:
+                raise IOError(f"Failed to write {self.path}: {e}") from e
+
+            self._map = self._load_map()
+
+    def _current_map(self) -> "_StoreMap":
+        store_map = self._map
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return _StoreMap()
+        if (stat.st_size, stat.st_mtime_ns) == store_map.stat:
+            return store_map
+        store_map = self._load_map()
+        self._map = store_map
+        return store_map
+
+    def _load_map(self) -> "_StoreMap":
+        # Header, size and map all come from one open file, so a file replaced
+        # by a rewrite in the meantime can't be mixed in.
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return _StoreMap()
+
+        with f:
+            stat = os.fstat(f.fileno())
+            magic, first_ordinal, code_count = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{self.path} is not a historical rate store.")
+            raw_codes = f.read(code_count * _CODE_WIDTH)
+
+            codes = [
+                raw_codes[i : i + _CODE_WIDTH].rstrip(b"\0").decode("ascii")
+                for i in range(0, len(raw_codes), _CODE_WIDTH)
+            ]
+            data_offset = _data_offset(code_count)
+            row_count = (stat.st_size - data_offset) // (8 * code_count)
+
+            if row_count > 0:
+                rows = np.memmap(
+                    f,
+                    dtype="<f8",
+                    mode="r",
+                    offset=data_offset,
+                    shape=(row_count, code_count),
+                )
+            else:
+                rows = np.empty((0, code_count))
+        return _StoreMap(first_ordinal, codes, rows, (stat.st_size, stat.st_mtime_ns))
+
+    def _rewrite(
+        self, store_map: "_StoreMap", first_ordinal: int, codes: list[str]
+    ) -> "_StoreMap":
+        # New currencies or an earlier first date change the layout of every
+        # row, so the file is rebuilt around the existing data. Readers holding
+        # the old map keep reading the old file until they take the new one.
+        old_rows = store_map.rows
+        row_count = 0
+        if store_map.codes:
+            row_count = len(old_rows) + store_map.first_ordinal - first_ordinal
+        rows = np.full((row_count, len(codes)), np.nan)
+        if len(old_rows):
+            start = store_map.first_ordinal - first_ordinal
+            rows[start : start + len(old_rows), : len(store_map.codes)] = old_rows
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, first_ordinal, len(codes)))
+            f.write(
+                b"".join(
+                    code.encode("ascii").ljust(_CODE_WIDTH, b"\0") for code in codes
+                )
+            )
+            f.write(b"\0" * (_data_offset(len(codes)) - f.tell()))
+            f.write(rows.astype("<f8").tobytes())
+
+        os.replace(temp_path, self.path)
+
+        store_map = self._load_map()
+        self._map = store_map
+        return store_map
+
+    def _write_rows(
+        self, store_map: "_StoreMap", rates_by_ordinal: dict[int, dict[str, Any]]
+    ) -> None:
+        code_count = len(store_map.codes)
+        data_offset = _data_offset(code_count)
+        row_size = 8 * code_count
+
+        with open(self.path, "r+b") as f:
+            row_count = len(store_map.rows)
+            last_index = max(rates_by_ordinal) - store_map.first_ordinal
+            if last_index >= row_count:
+                f.seek(data_offset + row_count * row_size)
+                f.write(
+                    np.full((last_index + 1 - row_count, code_count), np.nan)
+                    .astype("<f8")
+                    .tobytes()
+                )
+
+            for ordinal, rates in sorted(rates_by_ordinal.items()):
+                row = np.full(code_count, np.nan, dtype="<f8")
+                for code, rate in rates.items():
+                    row[store_map.columns[code]] = rate
+                f.seek(data_offset + (ordinal - store_map.first_ordinal) * row_size)
+                f.write(row.tobytes())
+
+
+class _StoreMap:
+    # Layout and memory map of the file at one point in time.
+
+    __slots__ = ("first_ordinal", "codes", "columns", "rows", "stat")
+
+    def __init__(
+        self,
+        first_ordinal: int = 0,
+        codes: list[str] | None = None,
+        rows: np.ndarray | None = None,
+        stat: tuple[int, int] | None = None,
+    ):
+        self.first_ordinal = first_ordinal
+        self.codes = codes or []
+        self.columns = {code: index for index, code in enumerate(self.codes)}
+        self.rows = rows if rows is not None else np.empty((0, 0))
+        self.stat = stat
+
+    def row(self, ordinal: int) -> np.ndarray | None:
+        index = ordinal - self.first_ordinal
+        if not self.codes or index < 0 or index >= len(self.rows):
+            return None
+        return self.rows[index]
+
+
+def _data_offset(code_count: int) -> int:
+    header_size = _HEADER.size + code_count * _CODE_WIDTH
+    return -(-header_size // _ALIGNMENT) * _ALIGNMENT
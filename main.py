@@ -1,8 +1,10 @@
+import argparse
+import sys
 from datetime import datetime, timedelta
 from typing import Any
 
-import requests
 from currencyhandler import CurrencyHandler
+from currencyindex import CurrencyIndex
 
 # DO NOT UPLOAD A VIRTUAL ENVIRONMENT TO GIT
 # Add the name of your virtual environment to .gitignore
@@ -18,7 +20,214 @@ from currencyhandler import CurrencyHandler
 # want to use currencies
 
 
-def main() -> None:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """
+    Parse the command line. Without a subcommand the interactive menu is started.
+
+    Args:
+        argv: Arguments to parse, defaults to sys.argv[1:].
+
+    Returns:
+        The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Currency converter")
+    subparsers = parser.add_subparsers(dest="command")
+
+    # Shared by the one-shot subcommands.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use the last saved rates and never make a request",
+    )
+
+    convert_parser = subparsers.add_parser(
+        "convert", parents=[common], help="Convert an amount and print the result"
+    )
+    convert_parser.add_argument("amount", type=float)
+    convert_parser.add_argument("from_currency", metavar="from")
+    convert_parser.add_argument("to_currency", metavar="to")
+    convert_parser.add_argument(
+        "--date", help="Convert at the rates of a day (YYYY-MM-DD)"
+    )
+
+    rates_parser = subparsers.add_parser(
+        "rates", parents=[common], help="Print the latest USD based rates"
+    )
+    rates_parser.add_argument(
+        "codes", nargs="*", metavar="code", help="Currencies to print, all if left out"
+    )
+
+    history_parser = subparsers.add_parser(
+        "history", parents=[common], help="Print the daily rates of a currency"
+    )
+    history_parser.add_argument("currency")
+    history_parser.add_argument("--days", type=int, default=7)
+    history_parser.add_argument(
+        "--end-date", help="Last day of the period (YYYY-MM-DD), today if left out"
+    )
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Convert a CSV or JSONL file of (amount, from, to[, date])"
+    )
+    batch_parser.add_argument(
+        "input", nargs="?", default="-", help="Input file, or - for stdin"
+    )
+    batch_parser.add_argument(
+        "-o", "--output", default="-", help="Output file, or - for stdout"
+    )
+    batch_parser.add_argument(
+        "-f",
+        "--format",
+        choices=("csv", "jsonl"),
+        help="Input and output format, guessed from the input file name if left out",
+    )
+    batch_parser.add_argument(
+        "--chunk-size", type=int, default=10000, help="Records converted per pass"
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve conversions and rates over HTTP"
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+
+    return parser.parse_args(argv)
+
+
+def run_batch_command(args: argparse.Namespace) -> None:
+    """
+    Run the non-interactive batch conversion and report throughput on stderr.
+
+    Args:
+        args: Parsed arguments of the batch subcommand.
+    """
+    from batchconvert import run_batch
+
+    file_format = args.format
+    if file_format is None:
+        is_jsonl = args.input.endswith((".jsonl", ".ndjson"))
+        file_format = "jsonl" if is_jsonl else "csv"
+
+    input_stream = (
+        sys.stdin
+        if args.input == "-"
+        else open(args.input, encoding="utf-8", newline="")
+    )
+    output_stream = (
+        sys.stdout
+        if args.output == "-"
+        else open(args.output, "w", encoding="utf-8", newline="")
+    )
+
+    try:
+        stats = run_batch(
+            CurrencyHandler(),
+            input_stream,
+            output_stream,
+            file_format=file_format,
+            chunk_size=args.chunk_size,
+        )
+    except (ValueError, ConnectionError, TimeoutError) as e:
+        sys.exit(f"Error: {e}")
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+    print(
+        f"Converted {stats['records']} records ({stats['failed']} failed) "
+        f"in {stats['seconds']:.2f}s, {stats['records_per_second']:.0f} records/s",
+        file=sys.stderr,
+    )
+
+
+def run_convert_command(args: argparse.Namespace) -> None:
+    """
+    Convert one amount and print the converted amount.
+
+    Args:
+        args: Parsed arguments of the convert subcommand.
+    """
+    currency_handler = CurrencyHandler(offline=args.offline)
+    from_currency = args.from_currency.upper()
+    to_currency = args.to_currency.upper()
+
+    if args.date is None:
+        rate = currency_handler.get_cross_rate(from_currency, to_currency)
+    else:
+        rates = currency_handler.get_historical_rates(args.date)
+        if from_currency not in rates or to_currency not in rates:
+            raise ValueError("The currency code you selected is not in our database.")
+        rate = rates[to_currency] / rates[from_currency]
+
+    print(f"{args.amount * rate} {to_currency}")
+
+
+def run_rates_command(args: argparse.Namespace) -> None:
+    """
+    Print the latest USD based rates, one currency per line.
+
+    Args:
+        args: Parsed arguments of the rates subcommand.
+    """
+    rates = CurrencyHandler(offline=args.offline).get_snapshot().get("rates", {})
+    codes = [code.upper() for code in args.codes] or sorted(rates)
+    unknown = [code for code in codes if code not in rates]
+    if unknown:
+        raise ValueError(f"Unknown currency code(s): {', '.join(unknown)}.")
+
+    for code in codes:
+        print(f"{code}: {rates[code]}")
+
+
+def run_history_command(args: argparse.Namespace) -> None:
+    """
+    Print the daily rates of a currency followed by their statistics.
+
+    Args:
+        args: Parsed arguments of the history subcommand.
+    """
+    if args.days < 0:
+        raise ValueError("The number of days can't be negative.")
+
+    currency = args.currency.upper()
+    rate_series = CurrencyHandler(offline=args.offline).get_rate_series(
+        currency=currency,
+        days=args.days,
+        end_date=args.end_date,
+        windows=(args.days + 1,),
+    )
+    for date, rate in rate_series:
+        print(f"{date} - {currency}: {rate}")
+
+    if len(rate_series):
+        trend = rate_series.stats(args.days + 1)
+        print(
+            f"Lowest: {trend['min']:.4f}  Highest: {trend['max']:.4f}  "
+            f"Average: {trend['mean']:.4f}  Std dev: {trend['stddev']:.4f}  "
+            f"Change: {trend['pct_change']:+.2f}%"
+        )
+
+
+def suggest_currencies(currency_index: CurrencyIndex, query: str) -> None:
+    """
+    Print the currencies closest to something that isn't a currency code.
+
+    Args:
+        currency_index: Index to search, from CurrencyHandler.get_currency_index.
+        query: What the user typed, a code or part of a currency name.
+    """
+    matches = currency_index.search(query, limit=5)
+    if matches:
+        suggestions = ", ".join(
+            f"{code} ({currency_index.name(code)})" for code in matches
+        )
+        print(f"Did you mean: {suggestions}")
+
+
+def main(argv: list[str] | None = None) -> None:
     """
     The main function that runs the currency conversion application.
 
@@ -38,7 +247,36 @@ def main() -> None:
     [5] - Get historical exchange rate
     [6] - List historical rates for a currency + more
     [7] - Exit the application
+
+    Args:
+        argv: Command line arguments, see parse_args.
     """
+    args = parse_args(argv)
+    if args.command == "batch":
+        run_batch_command(args)
+        return
+    if args.command in ("convert", "rates", "history"):
+        commands = {
+            "convert": run_convert_command,
+            "rates": run_rates_command,
+            "history": run_history_command,
+        }
+        try:
+            commands[args.command](args)
+        except (ValueError, ConnectionError, TimeoutError) as e:
+            sys.exit(f"Error: {e}")
+        return
+    if args.command == "serve":
+        from conversionserver import ConversionServer
+
+        server = ConversionServer(host=args.host, port=args.port)
+        print(f"Serving on {server.url}, press Ctrl+C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
     # Use this instance of CurrencyHandler to do stuff in your menu.
     currency_handler = CurrencyHandler()
 
@@ -58,14 +296,15 @@ def main() -> None:
 
         if choice == "0":
             try:
-                currency_handler.list_currencies()
+                for code, currency_name in currency_handler.list_currencies():
+                    print(f"{code}: {currency_name}")
             except ConnectionError:
                 print(
                     "We have run in to a problem with the connection, please try again."
                 )
 
         elif choice == "1":
-            get_existing_currency = currency_handler.fetch_currency_data()
+            currency_index = currency_handler.get_currency_index()
 
             selected_currency = str(
                 input(
@@ -75,10 +314,11 @@ def main() -> None:
             while True:
                 if selected_currency == "Q":
                     break
-                elif selected_currency in get_existing_currency["rates"]:
+                elif selected_currency in currency_index:
                     selected_currency = selected_currency
                     break
                 else:
+                    suggest_currencies(currency_index, selected_currency)
                     selected_currency = str(
                         input(
                             "The currency code you selected is not in our database, please try again: "
@@ -114,10 +354,10 @@ def main() -> None:
 
         elif choice == "3":
             currency_handler.export_to_json()
-            print("Log is saved as currency_log.json")
+            print(f"Log is saved as {currency_handler.log_path}")
 
         elif choice == "4":
-            get_existing_currency = currency_handler.fetch_currency_data()
+            currency_index = currency_handler.get_currency_index()
 
             while True:
                 from_currency = str(
@@ -127,10 +367,11 @@ def main() -> None:
                 )
                 if from_currency == "Q":
                     break
-                elif from_currency in get_existing_currency["rates"]:
+                elif from_currency in currency_index:
                     from_currency = from_currency
                     break
                 else:
+                    suggest_currencies(currency_index, from_currency)
                     from_currency = str(
                         input(
                             "The currency code you selected is not in our database, please try again: "
@@ -145,10 +386,11 @@ def main() -> None:
                 )
                 if to_currency == "Q":
                     break
-                elif to_currency in get_existing_currency["rates"]:
+                elif to_currency in currency_index:
                     to_currency = to_currency
                     break
                 else:
+                    suggest_currencies(currency_index, to_currency)
                     to_currency = str(
                         input(
                             "The currency code you selected is not in our database, please try again: "
@@ -181,7 +423,7 @@ def main() -> None:
             )
 
         elif choice == "5":
-            get_existing_currency = currency_handler.fetch_currency_data()
+            currency_index = currency_handler.get_currency_index()
             while True:
                 desired_historical_rate = str(
                     input(
@@ -190,10 +432,11 @@ def main() -> None:
                 )
                 if desired_historical_rate == "Q":
                     break
-                elif desired_historical_rate in get_existing_currency["rates"]:
+                elif desired_historical_rate in currency_index:
                     desired_historical_rate = desired_historical_rate
                     break
                 else:
+                    suggest_currencies(currency_index, desired_historical_rate)
                     desired_historical_rate = str(
                         input(
                             "The currency code you selected is not in our database, please try again: "
@@ -225,7 +468,7 @@ def main() -> None:
             )
 
         elif choice == "6":
-            get_existing_currency = currency_handler.fetch_currency_data()
+            currency_index = currency_handler.get_currency_index()
             max_days = 14
 
             while True:
@@ -236,10 +479,11 @@ def main() -> None:
                 )
                 if desired_historical_rate == "Q":
                     break
-                elif desired_historical_rate in get_existing_currency["rates"]:
+                elif desired_historical_rate in currency_index:
                     desired_historical_rate = desired_historical_rate
                     break
                 else:
+                    suggest_currencies(currency_index, desired_historical_rate)
                     desired_historical_rate = str(
                         input(
                             "The currency code you selected is not in our database, please try again: "
@@ -271,21 +515,28 @@ def main() -> None:
                         "The number of days you askt for in not valed, please try again."
                     )
 
-            completed_historical_value = currency_handler.get_historical_rate(
-                date=historical_date, base_currency=desired_historical_rate
+            ending_date = starting_date + timedelta(days=number_of_days)
+            rate_series = currency_handler.get_rate_series(
+                currency=desired_historical_rate,
+                days=number_of_days,
+                end_date=ending_date.strftime("%Y-%m-%d"),
+                windows=(number_of_days + 1,),
             )
-            historical_rate = completed_historical_value.get("rates", {})
-            historical_value = historical_rate.get(desired_historical_rate)
 
             print("")
             print(f"The rate for 1 USD in {desired_historical_rate}:")
-            for day in range(number_of_days + 1):
-                date = starting_date + timedelta(days=day)
+            for date, historical_value in rate_series:
+                print("")
+                print(date + f" - {desired_historical_rate}: {historical_value}")
+
+            if len(rate_series):
+                trend = rate_series.stats(number_of_days + 1)
                 print("")
                 print(
-                    date.strftime("%Y-%m-%d")
-                    + f" - {desired_historical_rate}: {historical_value}"
+                    f"Lowest: {trend['min']:.4f}  Highest: {trend['max']:.4f}  "
+                    f"Average: {trend['mean']:.4f}  Std dev: {trend['stddev']:.4f}"
                 )
+                print(f"Change over the period: {trend['pct_change']:+.2f}%")
 
         elif choice == "7":
             print("Thank you for using the Currency Converter. Goodbye!")
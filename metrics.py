@@ -0,0 +1,245 @@
+import bisect
+import math
+import threading
+from typing import Callable
+
+# Upper bounds in seconds of the latency histogram buckets.
+DEFAULT_BUCKETS = (
+    0.00001,
+    0.0001,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_LabelKey = tuple[tuple[str, str], ...]
+
+
+class MetricsHook:
+    """
+    Receives every metric update, e.g. to forward it to StatsD or a log.
+
+    Subclass it and override on_metric, then pass it to Metrics.add_hook.
+    """
+
+    def on_metric(
+        self, kind: str, name: str, value: float, labels: dict[str, str]
+    ) -> None:
+        """
+        Handle one metric update.
+
+        Args:
+            kind: "counter", "histogram" or "gauge".
+            name: Metric name.
+            value: Amount added, value observed or value set.
+            labels: Labels of the metric.
+        """
+
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and latency histograms with a Prometheus dump.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Initialize an empty set of metrics.
+
+        Args:
+            buckets: Upper bounds of the histogram buckets, in increasing order.
+        """
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[_LabelKey, float]] = {}
+        self._gauges: dict[str, dict[_LabelKey, float]] = {}
+        self._gauge_functions: dict[str, dict[_LabelKey, Callable[[], float]]] = {}
+        self._histograms: dict[str, dict[_LabelKey, list]] = {}
+        self._hooks: list[MetricsHook] = []
+
+    def add_hook(self, hook: MetricsHook) -> None:
+        """
+        Register a hook that is called on every metric update.
+
+        Args:
+            hook: The hook to add.
+        """
+        self._hooks.append(hook)
+
+    def increment(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """
+        Add to a counter.
+
+        Args:
+            name: Metric name.
+            value: Amount to add.
+            **labels: Labels of the metric.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+        self._notify("counter", name, value, labels)
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        """
+        Set a gauge to a value.
+
+        Args:
+            name: Metric name.
+            value: New value.
+            **labels: Labels of the metric.
+        """
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+        self._notify("gauge", name, value, labels)
+
+    def register_gauge(
+        self, name: str, function: Callable[[], float | None], **labels: str
+    ) -> None:
+        """
+        Register a gauge whose value is read from a function when it's dumped.
+
+        Args:
+            name: Metric name.
+            function: Returns the current value, or None if there is none.
+            **labels: Labels of the metric.
+        """
+        with self._lock:
+            self._gauge_functions.setdefault(name, {})[_label_key(labels)] = function
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Record a value, usually a duration in seconds, in a histogram.
+
+        Args:
+            name: Metric name.
+            value: Observed value.
+            **labels: Labels of the metric.
+        """
+        key = _label_key(labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram = series[key]
+            histogram[0][bucket] += 1
+            histogram[1] += value
+            histogram[2] += 1
+        self._notify("histogram", name, value, labels)
+
+    def get_counter(self, name: str, **labels: str) -> float:
+        """
+        Get the current value of a counter.
+
+        Args:
+            name: Metric name.
+            **labels: Labels of the metric.
+
+        Returns:
+            The counter value, 0 if it was never incremented.
+        """
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def get_histogram(self, name: str, **labels: str) -> tuple[int, float]:
+        """
+        Get the number and sum of the values recorded in a histogram.
+
+        Args:
+            name: Metric name.
+            **labels: Labels of the metric.
+
+        Returns:
+            A (count, sum) tuple.
+        """
+        with self._lock:
+            histogram = self._histograms.get(name, {}).get(_label_key(labels))
+            if histogram is None:
+                return 0, 0.0
+            return histogram[2], histogram[1]
+
+    def to_prometheus(self) -> str:
+        """
+        Dump all metrics in the Prometheus text exposition format.
+
+        Returns:
+            The metrics as text, ready to be served on a /metrics endpoint.
+        """
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+            gauge_functions = {
+                name: dict(series) for name, series in self._gauge_functions.items()
+            }
+            histograms = {
+                name: {key: (list(h[0]), h[1], h[2]) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+
+        for name, series in gauge_functions.items():
+            for key, function in series.items():
+                value = function()
+                gauges.setdefault(name, {})[key] = math.nan if value is None else value
+
+        lines = []
+        for name, series in sorted(counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        for name, series in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        for name, series in sorted(histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for key, (bucket_counts, total, count) in series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(key + (("le", repr(bound)),))
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                labels = _format_labels(key + (("le", "+Inf"),))
+                lines.append(f"{name}_bucket{labels} {count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    def _notify(
+        self, kind: str, name: str, value: float, labels: dict[str, str]
+    ) -> None:
+        for hook in self._hooks:
+            hook.on_metric(kind, name, value, labels)
+
+
+def _label_key(labels: dict[str, str]) -> _LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: _LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in key
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
@@ -0,0 +1,419 @@
+from __future__ import annotations
+
+import abc
+import json
+import os
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable
+
+from metrics import Metrics
+
+# requests is imported on the first request, see CurrencyHandler.
+if TYPE_CHECKING:
+    import requests
+
+# Statuses the historical endpoint answers with for days it has no data for.
+_NO_DATA_STATUSES = (400, 404)
+
+
+class RateProvider(abc.ABC):
+    """
+    Source of exchange rates, answering in the openexchangerates format.
+
+    Subclasses implement the three fetch methods. A source that can't be used
+    raises ConnectionError or TimeoutError, which is what CurrencyHandler
+    falls back to the next provider on.
+    """
+
+    # Label of the provider in metrics and error messages.
+    name = "provider"
+    # Whether requests go over the network and count against a request budget.
+    remote = True
+
+    @abc.abstractmethod
+    def fetch_latest(self, conditional: bool = False) -> dict[str, Any] | None:
+        """
+        Fetch the latest USD based rates.
+
+        Args:
+            conditional: Return None instead of a snapshot when the rates haven't
+                changed since the last snapshot this provider returned.
+
+        Returns:
+            A snapshot with "timestamp", "base" and "rates", or None if
+            conditional and nothing changed.
+
+        Raises:
+            ConnectionError: If the source can't be reached or read.
+            TimeoutError: If the source doesn't respond in time.
+        """
+
+    @abc.abstractmethod
+    def fetch_historical(self, date: str) -> dict[str, Any]:
+        """
+        Fetch the USD based rates of a past day.
+
+        Args:
+            date: Date in YYYY-MM-DD format
+
+        Returns:
+            A snapshot with "rates", or without it if the source has no data
+            for the date.
+
+        Raises:
+            ConnectionError: If the source can't be reached or read.
+            TimeoutError: If the source doesn't respond in time.
+        """
+
+    @abc.abstractmethod
+    def fetch_currencies(self) -> dict[str, str]:
+        """
+        Fetch the full names of the currencies.
+
+        Returns:
+            A dictionary of currency code to name.
+
+        Raises:
+            ConnectionError: If the source can't be reached or read.
+            TimeoutError: If the source doesn't respond in time.
+        """
+
+
+class OpenExchangeRatesProvider(RateProvider):
+    """
+    Rates from the openexchangerates API, or a server answering like it.
+
+    Requests share one keep-alive session with retries and exponential
+    backoff, and the latest rates are fetched conditionally with the ETag of
+    the previous response.
+    """
+
+    name = "openexchangerates"
+
+    def __init__(
+        self,
+        base_url: str = "https://openexchangerates.org/api",
+        app_id: str = "f33364a5d1c040b6b44597e443dfc1f4",
+        timeout: tuple[float, float] = (3.05, 10),
+        max_retries: int = 3,
+        pool_size: int = 8,
+        metrics: Metrics | None = None,
+    ):
+        """
+        Initialize the provider. The session is created on the first request.
+
+        Args:
+            base_url: Base URL of the API, e.g. a local stand-in server.
+            app_id: App ID the API is called with.
+            timeout: Connect and read timeout in seconds for every request.
+            max_retries: Number of retries, with exponential backoff, for failed
+                requests before giving up.
+            pool_size: Number of keep-alive connections, one per thread making
+                requests at the same time.
+            metrics: Collector for request counts, latencies and sizes.
+        """
+        self.base_url = base_url
+        self.latest_url = f"{base_url}/latest.json?app_id={app_id}"
+        self.currencies_url = f"{base_url}/currencies.json?prettyprint=false&show_alternative=false&show_inactive=false&app_id={app_id}"
+        self.historical_url = f"{base_url}/historical/{{date}}.json?app_id={app_id}&base=USD"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.metrics = metrics
+        self._session: requests.Session | None = None
+        self._session_lock = threading.Lock()
+        self._validators: dict[str, dict[str, str]] = {}
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        HTTP session used for API requests, created on the first request.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def fetch_latest(self, conditional: bool = False) -> dict[str, Any] | None:
+        if not conditional:
+            self._validators.pop(self.latest_url, None)
+        return self._get_json(self.latest_url, "latest", conditional=True)
+
+    def fetch_historical(self, date: str) -> dict[str, Any]:
+        return self._get_json(
+            self.historical_url.format(date=date), "historical", no_data_ok=True
+        )
+
+    def fetch_currencies(self) -> dict[str, str]:
+        return self._get_json(self.currencies_url, "currencies")
+
+    def _create_session(self) -> requests.Session:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+        )
+        adapter = HTTPAdapter(pool_maxsize=self.pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.headers["accept"] = "application/json"
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _get_json(
+        self,
+        url: str,
+        endpoint: str,
+        conditional: bool = False,
+        no_data_ok: bool = False,
+    ) -> dict[str, Any] | None:
+        # With no_data_ok, a 400 or 404 means the API has nothing for the URL
+        # and is returned as an empty response; other errors always raise.
+        import requests
+
+        headers = self._validators.get(url, {}) if conditional else {}
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            if self.metrics is not None:
+                self._record_request(endpoint, "error", start, 0)
+            raise _to_network_error(e) from e
+
+        if self.metrics is not None:
+            self._record_request(
+                endpoint, str(response.status_code), start, len(response.content)
+            )
+
+        if conditional and response.status_code == 304:
+            return None
+        if no_data_ok and response.status_code in _NO_DATA_STATUSES:
+            return {}
+        if not response.ok:
+            raise ConnectionError(
+                f"Server answered with status {response.status_code}."
+            )
+
+        try:
+            response_data = response.json()
+        except ValueError as e:
+            raise ConnectionError("Invalid response from server.") from e
+
+        validators = {}
+        if "ETag" in response.headers:
+            validators["If-None-Match"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            validators["If-Modified-Since"] = response.headers["Last-Modified"]
+        if conditional and validators:
+            self._validators[url] = validators
+
+        return response_data
+
+    def _record_request(
+        self, endpoint: str, status: str, start: float, size: int
+    ) -> None:
+        self.metrics.increment(
+            "currency_handler_upstream_requests_total",
+            endpoint=endpoint,
+            status=status,
+            provider=self.name,
+        )
+        self.metrics.observe(
+            "currency_handler_upstream_seconds",
+            time.perf_counter() - start,
+            endpoint=endpoint,
+            provider=self.name,
+        )
+        self.metrics.increment(
+            "currency_handler_upstream_bytes_total",
+            size,
+            endpoint=endpoint,
+            provider=self.name,
+        )
+
+
+class FileRateProvider(RateProvider):
+    """
+    Rates from a local JSON file, e.g. a feed dropped by another system.
+
+    The file holds a latest.json style object, optionally with the currency
+    names under "currencies" and past days under "historical":
+        {"timestamp": 1700000000, "base": "USD", "rates": {"SEK": 10.5, ...},
+         "currencies": {"SEK": "Swedish Krona", ...},
+         "historical": {"2024-01-15": {"SEK": 10.4, ...}, ...}}
+
+    The file is parsed again only when its modification time changes.
+    """
+
+    name = "file"
+    remote = False
+
+    def __init__(self, path: str):
+        """
+        Initialize the provider. The file is read on the first fetch.
+
+        Args:
+            path: Path of the JSON file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: dict[str, Any] = {}
+        self._mtime: float | None = None
+        self._returned_mtime: float | None = None
+
+    def fetch_latest(self, conditional: bool = False) -> dict[str, Any] | None:
+        data, mtime = self._load()
+        if conditional and mtime == self._returned_mtime:
+            return None
+        self._returned_mtime = mtime
+        return {
+            "timestamp": data.get("timestamp", int(mtime)),
+            "base": data.get("base", "USD"),
+            "rates": dict(data["rates"]),
+        }
+
+    def fetch_historical(self, date: str) -> dict[str, Any]:
+        data, _ = self._load()
+        rates = data.get("historical", {}).get(date)
+        if not rates:
+            return {}
+        return {"base": data.get("base", "USD"), "rates": dict(rates)}
+
+    def fetch_currencies(self) -> dict[str, str]:
+        data, _ = self._load()
+        # Without names in the file the codes stand in for them.
+        return dict(data.get("currencies") or {code: code for code in data["rates"]})
+
+    def _load(self) -> tuple[dict[str, Any], float]:
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if mtime != self._mtime:
+                    with open(self.path, encoding="utf-8") as f:
+                        data = json.load(f)
+                    if not isinstance(data, dict) or not isinstance(
+                        data.get("rates"), dict
+                    ):
+                        raise ValueError("No rates in the file.")
+                    self._data, self._mtime = data, mtime
+            except (OSError, ValueError) as e:
+                raise ConnectionError(f"Can't read rates from {self.path}.") from e
+            return self._data, self._mtime
+
+
+def call_providers(
+    providers: list[RateProvider],
+    call: Callable[[RateProvider], Any],
+    hedge_after: float | None = None,
+    metrics: Metrics | None = None,
+) -> tuple[RateProvider, Any]:
+    """
+    Call providers in order until one of them succeeds.
+
+    A provider that raises ConnectionError or TimeoutError is followed by the
+    next one. With hedge_after set, the next provider is also started when the
+    running ones haven't answered within that many seconds, and whichever
+    answers first wins. Answers that come in later are dropped.
+
+    Args:
+        providers: Providers in order of preference.
+        call: Function making the request to one provider.
+        hedge_after: Seconds to wait for an answer before also asking the next
+            provider. Providers are only tried one at a time when left out.
+        metrics: Collector for hedged requests and provider failures.
+
+    Returns:
+        A tuple of the provider that answered and its answer.
+
+    Raises:
+        ConnectionError: If every provider failed, or there are none.
+        TimeoutError: If every provider failed and the last one timed out.
+    """
+    if not providers:
+        raise ConnectionError("No rate providers are configured.")
+
+    if hedge_after is None:
+        error: Exception | None = None
+        for provider in providers:
+            try:
+                return provider, call(provider)
+            except (ConnectionError, TimeoutError) as e:
+                _record_failure(metrics, provider)
+                error = e
+        raise error
+
+    results: queue.SimpleQueue = queue.SimpleQueue()
+
+    def run(provider: RateProvider) -> None:
+        try:
+            results.put((provider, call(provider), None))
+        except BaseException as e:
+            results.put((provider, None, e))
+
+    def start(index: int) -> None:
+        threading.Thread(target=run, args=(providers[index],), daemon=True).start()
+
+    start(0)
+    started = 1
+    running = 1
+    while running:
+        try:
+            provider, result, error = results.get(
+                timeout=hedge_after if started < len(providers) else None
+            )
+        except queue.Empty:
+            if metrics is not None:
+                metrics.increment(
+                    "currency_handler_hedged_requests_total",
+                    provider=providers[started].name,
+                )
+            start(started)
+            started += 1
+            running += 1
+            continue
+
+        running -= 1
+        if error is None:
+            return provider, result
+        if not isinstance(error, (ConnectionError, TimeoutError)):
+            raise error
+        _record_failure(metrics, provider)
+        if not running and started < len(providers):
+            start(started)
+            started += 1
+            running += 1
+    raise error
+
+
+def _record_failure(metrics: Metrics | None, provider: RateProvider) -> None:
+    if metrics is not None:
+        metrics.increment(
+            "currency_handler_provider_failures_total", provider=provider.name
+        )
+
+
+def _to_network_error(error: requests.RequestException) -> OSError:
+    import requests
+    from urllib3.exceptions import NewConnectionError
+    from urllib3.exceptions import TimeoutError as Urllib3TimeoutError
+
+    if isinstance(error, requests.Timeout):
+        return TimeoutError("Server timed out error.")
+
+    # Timeouts that used up all retries surface as a connection error.
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    if isinstance(reason, Urllib3TimeoutError) and not isinstance(
+        reason, NewConnectionError
+    ):
+        return TimeoutError("Server timed out error.")
+    return ConnectionError("Failed to connect to server.")
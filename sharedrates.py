@@ -0,0 +1,346 @@
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable
+
+import numpy as np
+
+from currencyindex import resolve_codes
+
+# Header: magic, sequence counter, capacity, number of codes, fetch time.
+# It is followed by one 8-byte ASCII code per slot, then one float64 rate per
+# slot plus a trailing NaN slot that unknown codes point to.
+_MAGIC = b"CHSHM001"
+_HEADER = struct.Struct("<8sQqqd")
+_SEQUENCE_OFFSET = 8
+_COUNT_OFFSET = 24
+_FETCHED_AT_OFFSET = 32
+_CODE_WIDTH = 8
+_ALIGNMENT = 64
+
+
+class SharedRatePublisher:
+    """
+    Owner side of a rate table kept in shared memory.
+
+    One process, usually the one running a CurrencyHandler with the background
+    refresher, publishes each new snapshot here. Worker processes attach with
+    SharedRateReader and convert straight from the shared block, so the pool
+    makes one set of upstream requests instead of one per process.
+
+    Writes follow a sequence lock: the counter is odd while a snapshot is being
+    written and even once it is complete, so readers never take a lock.
+    """
+
+    def __init__(self, name: str | None = None, capacity: int = 512):
+        """
+        Create the shared memory block.
+
+        Args:
+            name: Name of the block, generated when left out. Readers attach with
+                the same name.
+            capacity: Maximum number of currency codes the table can hold.
+        """
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._shm = SharedMemory(name=name, create=True, size=_block_size(capacity))
+        self._sequence, self._codes, self._rates = _views(self._shm, capacity)
+        _HEADER.pack_into(self._shm.buf, 0, _MAGIC, 0, capacity, 0, 0.0)
+        self._rates[0] = np.nan
+
+    @property
+    def name(self) -> str:
+        """
+        Name of the shared memory block, to pass to SharedRateReader.
+        """
+        return self._shm.name
+
+    @property
+    def version(self) -> int:
+        """
+        Number of snapshots published so far.
+        """
+        return int(self._sequence[0]) // 2
+
+    def publish(self, rates: dict[str, float], fetched_at: float) -> None:
+        """
+        Write a snapshot into the table.
+
+        Args:
+            rates: USD based rates keyed by 3-letter currency code.
+            fetched_at: Unix time the snapshot was fetched.
+
+        Raises:
+            ValueError: If there are more codes than the table has room for.
+        """
+        if len(rates) > self.capacity:
+            raise ValueError(
+                f"{len(rates)} currencies don't fit in a table of {self.capacity}."
+            )
+
+        codes = np.array(list(rates), dtype=f"S{_CODE_WIDTH}")
+        values = np.fromiter(rates.values(), dtype=np.float64, count=len(rates))
+        count = len(rates)
+
+        with self._lock:
+            sequence = int(self._sequence[0])
+            self._sequence[0] = sequence + 1
+            self._codes[:count] = codes
+            self._rates[:count] = values
+            self._rates[count] = np.nan
+            struct.pack_into("<qd", self._shm.buf, _COUNT_OFFSET, count, fetched_at)
+            self._sequence[0] = sequence + 2
+
+    def close(self) -> None:
+        """
+        Detach from and remove the shared memory block.
+
+        Readers that are still attached keep their mapping until they close.
+        """
+        self._sequence = self._codes = self._rates = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+class SharedRateReader:
+    """
+    Read-only view of a rate table published by SharedRatePublisher.
+
+    Conversions read the rates in place, without copying the table, making any
+    network request or taking a lock. A read that overlaps a publish is retried.
+    """
+
+    def __init__(self, name: str):
+        """
+        Attach to a published table.
+
+        Args:
+            name: Name of the block, see SharedRatePublisher.name.
+
+        Raises:
+            FileNotFoundError: If no block with that name exists.
+            ValueError: If the block is not a rate table.
+        """
+        self._shm = _attach(name)
+        magic, _, capacity, _, _ = _HEADER.unpack_from(self._shm.buf, 0)
+        if magic != _MAGIC:
+            self._shm.close()
+            raise ValueError(f"Shared memory block '{name}' is not a rate table.")
+
+        self._sequence, self._codes, self._rates = _views(self._shm, capacity)
+        self._index_version = -1
+        self._code_index: dict[str, int] = {}
+
+    @property
+    def version(self) -> int:
+        """
+        Number of snapshots the owner has published so far.
+        """
+        return int(self._sequence[0]) // 2
+
+    @property
+    def snapshot_age(self) -> float | None:
+        """
+        Seconds since the published snapshot was fetched, or None if there is none.
+        """
+        if not self.version:
+            return None
+        fetched_at = self._read(
+            lambda sequence: struct.unpack_from(
+                "<d", self._shm.buf, _FETCHED_AT_OFFSET
+            )[0]
+        )
+        return time.time() - fetched_at
+
+    def get_rates(self) -> dict[str, float]:
+        """
+        Copy the published rates into a dictionary.
+
+        Returns:
+            A dictionary of currency code to USD based rate.
+
+        Raises:
+            LookupError: If nothing has been published yet.
+        """
+
+        def read(sequence: int) -> dict[str, float]:
+            code_index = self._current_index(sequence)
+            return {code: float(self._rates[i]) for code, i in code_index.items()}
+
+        return self._read(read)
+
+    def convert_from_usd(self, amount: float, target_currency: str) -> float:
+        """
+        Convert an amount from USD to another currency.
+
+        Args:
+            amount: The amount in USD to be converted.
+            target_currency: The 3-letter code of the currency to convert to.
+
+        Returns:
+            The converted amount in the specified currency.
+
+        Raises:
+            ValueError: If the currency code is invalid.
+            LookupError: If nothing has been published yet.
+        """
+        return amount * self.get_cross_rate("USD", target_currency)
+
+    def convert_any_currency(
+        self, from_currency: str, to_currency: str, amount: float
+    ) -> float:
+        """
+        Convert an amount from one currency to another.
+
+        Args:
+            from_currency: The 3-letter code of the currency to convert from.
+            to_currency: The 3-letter code of the currency to convert to.
+            amount: The amount to be converted.
+
+        Returns:
+            The converted amount in the target currency.
+
+        Raises:
+            ValueError: If either currency code is invalid.
+            LookupError: If nothing has been published yet.
+        """
+        return amount * self.get_cross_rate(from_currency, to_currency)
+
+    def get_cross_rate(self, from_currency: str, to_currency: str) -> float:
+        """
+        Get the exchange rate between two currencies in the published snapshot.
+
+        Args:
+            from_currency: The 3-letter code of the currency to convert from.
+            to_currency: The 3-letter code of the currency to convert to.
+
+        Returns:
+            The number of to_currency units one from_currency unit buys.
+
+        Raises:
+            ValueError: If either currency code is invalid.
+            LookupError: If nothing has been published yet.
+        """
+
+        def read(sequence: int) -> float | None:
+            code_index = self._current_index(sequence)
+            from_index = code_index.get(from_currency)
+            to_index = code_index.get(to_currency)
+            if from_index is None or to_index is None:
+                return None
+            return float(self._rates[to_index] / self._rates[from_index])
+
+        rate = self._read(read)
+        if rate is None:
+            raise ValueError("The currency code you selected is not in our database.")
+        return rate
+
+    def convert_many(
+        self, amounts: Any, from_currencies: str | Any, to_currencies: str | Any
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Convert many amounts in one vectorized pass against the published snapshot.
+
+        Args:
+            amounts: Sequence or array of amounts to convert.
+            from_currencies: One 3-letter code for all rows, or one code per amount.
+            to_currencies: One 3-letter code for all rows, or one code per amount.
+
+        Returns:
+            A tuple of (converted, invalid), as returned by
+            CurrencyHandler.convert_many.
+
+        Raises:
+            ValueError: If the code arrays and the amounts have different lengths.
+            LookupError: If nothing has been published yet.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+
+        def read(sequence: int) -> tuple[np.ndarray, int, Any, Any]:
+            code_index = self._current_index(sequence)
+            from_indices = resolve_codes(from_currencies, code_index, amounts.shape)
+            to_indices = resolve_codes(to_currencies, code_index, amounts.shape)
+            converted = amounts / self._rates[from_indices] * self._rates[to_indices]
+            return converted, len(code_index), from_indices, to_indices
+
+        converted, unknown, from_indices, to_indices = self._read(read)
+        invalid = np.broadcast_to(
+            (from_indices == unknown) | (to_indices == unknown), converted.shape
+        )
+        return converted, invalid
+
+    def close(self) -> None:
+        """
+        Detach from the shared memory block.
+        """
+        self._sequence = self._codes = self._rates = None
+        self._shm.close()
+
+    def _read(self, read: Callable[[int], Any]) -> Any:
+        while True:
+            sequence = int(self._sequence[0])
+            if sequence & 1:
+                # The owner is in the middle of a publish.
+                time.sleep(0)
+                continue
+            if sequence == 0:
+                raise LookupError("No rates have been published yet.")
+
+            result = read(sequence)
+            if int(self._sequence[0]) == sequence:
+                return result
+
+    def _current_index(self, sequence: int) -> dict[str, int]:
+        if sequence == self._index_version:
+            return self._code_index
+
+        count = struct.unpack_from("<q", self._shm.buf, _COUNT_OFFSET)[0]
+        codes = self._codes[: min(max(count, 0), len(self._codes))].tolist()
+        code_index = {code.decode("ascii"): index for index, code in enumerate(codes)}
+        # Only keep the index once it's known to belong to a complete snapshot.
+        if int(self._sequence[0]) == sequence:
+            self._code_index = code_index
+            self._index_version = sequence
+        return code_index
+
+
+def _block_size(capacity: int) -> int:
+    return _codes_offset() + capacity * _CODE_WIDTH + (capacity + 1) * 8
+
+
+def _codes_offset() -> int:
+    return -(-_HEADER.size // _ALIGNMENT) * _ALIGNMENT
+
+
+def _views(
+    shm: SharedMemory, capacity: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    codes_offset = _codes_offset()
+    rates_offset = codes_offset + capacity * _CODE_WIDTH
+    sequence = np.ndarray((1,), dtype="<u8", buffer=shm.buf, offset=_SEQUENCE_OFFSET)
+    codes = np.ndarray(
+        (capacity,), dtype=f"S{_CODE_WIDTH}", buffer=shm.buf, offset=codes_offset
+    )
+    rates = np.ndarray(
+        (capacity + 1,), dtype="<f8", buffer=shm.buf, offset=rates_offset
+    )
+    return sequence, codes, rates
+
+
+def _attach(name: str) -> SharedMemory:
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # Before Python 3.13 attaching registers the block with the resource tracker,
+    # which would remove it when this process exits, so registering is skipped.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
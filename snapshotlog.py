@@ -0,0 +1,327 @@
+import bisect
+import contextlib
+import json
+import os
+import struct
+import threading
+from typing import Any, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Index entry per keyframe: fetch time and byte offset of the record in the log.
+_INDEX_ENTRY = struct.Struct("<dq")
+
+
+class SnapshotLog:
+    """
+    Append-only history of rate snapshots in a JSONL file.
+
+    Every keyframe_interval-th record, and any record where most rates changed,
+    is a keyframe holding the whole snapshot. The records in between only hold
+    the rates and fields that changed since the previous snapshot, so the cost
+    of a write follows what changed rather than the size of the snapshot. A
+    small binary index next to the log holds the time and offset of every
+    keyframe, so any snapshot is rebuilt by seeking to the keyframe before it
+    and replaying the deltas that follow. Appends hold a lock on path + ".lock",
+    so several processes can write the same log.
+
+    Record layout, one compact JSON object per line:
+        {"k": 1, "t": fetched_at, "s": snapshot}                     keyframe
+        {"t": fetched_at, "r": {changed rates}, "x": [removed codes],
+         "f": {changed fields}}                                      delta
+    """
+
+    def __init__(
+        self, path: str = "currency_log.jsonl", keyframe_interval: int = 24
+    ):
+        """
+        Initialize the log. The file is created on the first append.
+
+        Args:
+            path: Path of the JSONL log. The keyframe index is kept at path + ".idx".
+            keyframe_interval: Number of records from one keyframe to the next.
+        """
+        self.path = path
+        self.index_path = path + ".idx"
+        self.lock_path = path + ".lock"
+        self.keyframe_interval = keyframe_interval
+        self._lock = threading.Lock()
+        self._index: list[tuple[float, int]] | None = None
+        # State after the last record, loaded on the first append, and the
+        # size of the log once this instance's last record was written.
+        self._last: dict[str, Any] | None = None
+        self._since_keyframe = 0
+        self._end: int | None = None
+
+    def append(self, snapshot: dict[str, Any], fetched_at: float) -> None:
+        """
+        Add a snapshot to the end of the log.
+
+        Args:
+            snapshot: Snapshot as returned by the API, with a "rates" dictionary.
+            fetched_at: Unix time the snapshot was fetched.
+
+        Raises:
+            OSError: If the log can't be written.
+        """
+        with self._lock, _file_lock(self.lock_path), open(self.path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            if self._last is None or offset != self._end:
+                # Another process appended since this one last did, so the
+                # delta chain continues from the file rather than from memory.
+                self._index = None
+                self._load_tail()
+                offset = f.seek(0, os.SEEK_END)
+
+            record = None
+            if self._last is not None and (
+                self._since_keyframe < self.keyframe_interval - 1
+            ):
+                delta = _delta(self._last, snapshot)
+                # A delta touching most rates costs as much as a keyframe.
+                if len(delta.get("r", ())) <= len(snapshot.get("rates", ())) // 2:
+                    record = {"t": fetched_at, **delta}
+            if record is None:
+                record = {"k": 1, "t": fetched_at, "s": snapshot}
+
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+            data = line.encode("utf-8") + b"\n"
+            f.write(data)
+            f.flush()
+            self._end = offset + len(data)
+
+            if "k" in record:
+                # A new log starts a new index, dropping any left-over one.
+                with open(self.index_path, "ab" if offset else "wb") as index_file:
+                    index_file.write(_INDEX_ENTRY.pack(fetched_at, offset))
+                self._index.append((fetched_at, offset))
+                self._since_keyframe = 0
+            else:
+                self._since_keyframe += 1
+            self._last = _copy_snapshot(snapshot)
+
+    def latest(self) -> tuple[dict[str, Any], float] | None:
+        """
+        Rebuild the newest snapshot in the log.
+
+        Only the records from the last keyframe on are read.
+
+        Returns:
+            A (snapshot, fetched_at) tuple, or None if the log is empty.
+        """
+        with self._lock:
+            state = self._replay(self._keyframe_offset(None), None)
+            if state is None:
+                return None
+            return _copy_snapshot(state[0]), state[1]
+
+    def snapshot_at(self, when: float) -> tuple[dict[str, Any], float] | None:
+        """
+        Rebuild the snapshot that was current at a point in time.
+
+        Args:
+            when: Unix time to look up.
+
+        Returns:
+            A (snapshot, fetched_at) tuple for the last record fetched at or
+            before when, or None if the log has nothing that old.
+        """
+        with self._lock:
+            state = self._replay(self._keyframe_offset(when), when)
+            if state is None:
+                return None
+            return _copy_snapshot(state[0]), state[1]
+
+    def history(self) -> Iterator[tuple[dict[str, Any], float]]:
+        """
+        Iterate over every snapshot in the log, oldest first.
+
+        Yields:
+            (snapshot, fetched_at) tuples. Each snapshot is a new dictionary.
+        """
+        snapshot = None
+        for record in self._records(0):
+            snapshot = _apply(snapshot, record)
+            if snapshot is not None:
+                yield _copy_snapshot(snapshot), record["t"]
+
+    def _load_tail(self) -> None:
+        # Picks up where an existing log left off, so appends continue its
+        # delta chain instead of starting with a keyframe.
+        offset = self._keyframe_offset(None)
+        snapshot = None
+        count = -1
+        for record in self._records(offset):
+            if "k" in record:
+                count = 0
+            elif snapshot is not None:
+                count += 1
+            snapshot = _apply(snapshot, record)
+        self._last = snapshot
+        self._since_keyframe = count
+
+        # Ends a partial line left by a crash so the next record starts clean.
+        try:
+            with open(self.path, "rb+") as f:
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+        except FileNotFoundError:
+            pass
+
+    def _keyframe_offset(self, when: float | None) -> int:
+        if self._index is None:
+            self._index = self._read_index()
+        if when is None:
+            return self._index[-1][1] if self._index else 0
+
+        position = bisect.bisect_right(self._index, (when, float("inf")))
+        return self._index[position - 1][1] if position else 0
+
+    def _read_index(self) -> list[tuple[float, int]]:
+        try:
+            log_size = os.path.getsize(self.path)
+        except OSError:
+            return []
+
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % _INDEX_ENTRY.size
+            index = list(_INDEX_ENTRY.iter_unpack(data[:usable]))
+        except OSError:
+            index = None
+
+        if index is None or (index and index[-1][1] >= log_size):
+            index = self._rebuild_index()
+        return index
+
+    def _rebuild_index(self) -> list[tuple[float, int]]:
+        # The index is missing or ahead of the log, e.g. after the log was
+        # replaced, so it is recreated from the keyframes in the log.
+        index = []
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                if line.startswith(b'{"k":'):
+                    try:
+                        index.append((json.loads(line)["t"], offset))
+                    except (ValueError, KeyError):
+                        pass
+                offset += len(line)
+
+        with open(self.index_path, "wb") as f:
+            f.write(b"".join(_INDEX_ENTRY.pack(*entry) for entry in index))
+        return index
+
+    def _replay(
+        self, offset: int, until: float | None
+    ) -> tuple[dict[str, Any], float] | None:
+        snapshot = None
+        fetched_at = 0.0
+        for record in self._records(offset):
+            if until is not None and record["t"] > until:
+                break
+            snapshot = _apply(snapshot, record)
+            fetched_at = record["t"]
+        if snapshot is None:
+            return None
+        return snapshot, fetched_at
+
+    def _records(self, offset: int) -> Iterator[dict[str, Any]]:
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A write cut short by a crash leaves a partial last line.
+                    continue
+                if isinstance(record, dict) and "t" in record:
+                    yield record
+
+
+@contextlib.contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    # Held across processes for the whole append; the lock file itself stays
+    # empty.
+    with open(path, "ab") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _delta(previous: dict[str, Any], snapshot: dict[str, Any]) -> dict[str, Any]:
+    old_rates = previous.get("rates", {})
+    new_rates = snapshot.get("rates", {})
+    delta: dict[str, Any] = {}
+
+    changed = {
+        code: rate for code, rate in new_rates.items() if old_rates.get(code) != rate
+    }
+    if changed:
+        delta["r"] = changed
+    removed = [code for code in old_rates if code not in new_rates]
+    if removed:
+        delta["x"] = removed
+
+    fields = {
+        name: value
+        for name, value in snapshot.items()
+        if name != "rates" and previous.get(name) != value
+    }
+    # Fields that disappeared are written as null and dropped on replay.
+    fields.update(
+        {name: None for name in previous if name not in snapshot and name != "rates"}
+    )
+    if fields:
+        delta["f"] = fields
+    return delta
+
+
+def _apply(
+    snapshot: dict[str, Any] | None, record: dict[str, Any]
+) -> dict[str, Any] | None:
+    # Updates snapshot in place where possible; a delta before any keyframe is
+    # skipped since there is nothing to apply it to.
+    if "k" in record:
+        return _copy_snapshot(record["s"])
+    if snapshot is None:
+        return None
+
+    rates = snapshot.setdefault("rates", {})
+    rates.update(record.get("r", {}))
+    for code in record.get("x", ()):
+        rates.pop(code, None)
+    for name, value in record.get("f", {}).items():
+        if value is None:
+            snapshot.pop(name, None)
+        else:
+            snapshot[name] = value
+    return snapshot
+
+
+def _copy_snapshot(snapshot: dict[str, Any]) -> dict[str, Any]:
+    copy = dict(snapshot)
+    copy["rates"] = dict(snapshot.get("rates", {}))
+    return copy
@@ -0,0 +1,17 @@
+import os
+import sys
+from typing import Iterator
+
+import pytest
+
+# The modules live at the top of the repository, next to this directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer  # noqa: E402
+
+
+@pytest.fixture
+def stub_server() -> Iterator[StubServer]:
+    server = StubServer().start()
+    yield server
+    server.stop()
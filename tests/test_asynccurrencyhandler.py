@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from asynccurrencyhandler import AsyncCurrencyHandler
+from benchmarks.stub_server import StubServer
+from historicalstore import HistoricalRateStore
+
+
+def _handler(server: StubServer, tmp_path, **kwargs) -> AsyncCurrencyHandler:
+    return AsyncCurrencyHandler(
+        api_base_url=server.base_url,
+        history_path=str(tmp_path / "historical_rates.bin"),
+        **kwargs,
+    )
+
+
+def test_convert_any_currency_uses_latest_rates(stub_server, tmp_path):
+    async def run():
+        async with _handler(stub_server, tmp_path) as handler:
+            rates = (await handler.get_snapshot())["rates"]
+            converted = await handler.convert_any_currency("EUR", "SEK", 10)
+            return rates, converted
+
+    rates, converted = asyncio.run(run())
+    assert converted == pytest.approx(10 / rates["EUR"] * rates["SEK"])
+
+
+def test_concurrent_callers_share_one_request(stub_server, tmp_path):
+    async def run():
+        async with _handler(stub_server, tmp_path) as handler:
+            return await asyncio.gather(
+                *(handler.convert_from_usd(1, "SEK") for _ in range(50))
+            )
+
+    results = asyncio.run(run())
+    assert len(set(results)) == 1
+    assert stub_server.request_count == 1
+
+
+def test_historical_rates_are_stored_and_reused(stub_server, tmp_path):
+    async def run():
+        async with _handler(stub_server, tmp_path) as handler:
+            first = await handler.list_historical_rates_for_currency(
+                "SEK", 4, end_date="2024-01-10"
+            )
+            requests_after_first = stub_server.request_count
+            second = await handler.list_historical_rates_for_currency(
+                "SEK", 4, end_date="2024-01-10"
+            )
+            return first, requests_after_first, second
+
+    first, requests_after_first, second = asyncio.run(run())
+    assert [day for day, _ in first] == [f"2024-01-{day:02d}" for day in range(6, 11)]
+    assert first[0][1] == stub_server.historical_rates("2024-01-06")["SEK"]
+    assert requests_after_first == 5
+    assert second == first
+    assert stub_server.request_count == 5
+
+
+def test_unknown_currency_raises_value_error(stub_server, tmp_path):
+    async def run():
+        async with _handler(stub_server, tmp_path) as handler:
+            await handler.convert_any_currency("EUR", "XXX", 1)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+
+def test_error_status_raises_connection_error(stub_server, tmp_path):
+    async def run():
+        async with _handler(stub_server, tmp_path) as handler:
+            handler.latest_api_url = f"{stub_server.base_url}/missing.json"
+            await handler.convert_any_currency("EUR", "SEK", 1)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(run())
+
+
+def test_server_errors_are_retried_then_raised(tmp_path):
+    server = StubServer(failure_rate=1.0).start()
+    try:
+
+        async def run():
+            async with _handler(server, tmp_path, max_retries=1) as handler:
+                await handler.fetch_currency_data()
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(run())
+        assert server.request_count == 2
+    finally:
+        server.stop()
+
+
+def test_fetched_days_are_stored_when_others_fail(tmp_path):
+    server = StubServer(failure_rate=0.5).start()
+    try:
+
+        async def run():
+            async with _handler(server, tmp_path, max_retries=0) as handler:
+                await handler.list_historical_rates_for_currency(
+                    "SEK", 9, end_date="2024-01-10"
+                )
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(run())
+        assert 0 < server.failure_count < server.request_count == 10
+
+        store = HistoricalRateStore(str(tmp_path / "historical_rates.bin"))
+        dates = [f"2024-01-{day:02d}" for day in range(1, 11)]
+        stored = len(dates) - len(store.missing_dates(dates))
+        assert stored == server.request_count - server.failure_count
+    finally:
+        server.stop()
@@ -0,0 +1,105 @@
+import json
+from decimal import (
+    ROUND_CEILING,
+    ROUND_DOWN,
+    ROUND_FLOOR,
+    ROUND_HALF_DOWN,
+    ROUND_HALF_EVEN,
+    ROUND_HALF_UP,
+    ROUND_UP,
+    Decimal,
+)
+
+import pytest
+
+from currencyhandler import CurrencyHandler
+from fixedpoint import ROUNDING_MODES, conversion_factor, divide_rounded, scale_rate
+from providers import FileRateProvider
+
+
+@pytest.mark.parametrize(
+    "rounding, expected",
+    [
+        # Quotients 2.5, 3.5, -2.5, -3.5, 2.4 and -2.6.
+        (ROUND_HALF_EVEN, [2, 4, -2, -4, 2, -3]),
+        (ROUND_HALF_UP, [3, 4, -3, -4, 2, -3]),
+        (ROUND_HALF_DOWN, [2, 3, -2, -3, 2, -3]),
+        (ROUND_DOWN, [2, 3, -2, -3, 2, -2]),
+        (ROUND_UP, [3, 4, -3, -4, 3, -3]),
+        (ROUND_FLOOR, [2, 3, -3, -4, 2, -3]),
+        (ROUND_CEILING, [3, 4, -2, -3, 3, -2]),
+    ],
+)
+def test_divide_rounded_modes(rounding, expected):
+    pairs = [(5, 2), (7, 2), (-5, 2), (7, -2), (12, 5), (-13, 5)]
+    assert [divide_rounded(n, d, rounding) for n, d in pairs] == expected
+
+
+@pytest.mark.parametrize("rounding", ROUNDING_MODES)
+def test_divide_rounded_matches_decimal(rounding):
+    for numerator in range(-40, 41):
+        for denominator in (-7, -4, 3, 8):
+            expected = (Decimal(numerator) / Decimal(denominator)).quantize(
+                Decimal(1), rounding=rounding
+            )
+            assert divide_rounded(numerator, denominator, rounding) == int(expected)
+
+
+def test_divide_rounded_rejects_unknown_modes():
+    with pytest.raises(ValueError):
+        divide_rounded(1, 2, "ROUND_SIDEWAYS")
+
+
+def test_scale_rate_reads_the_written_decimal():
+    assert scale_rate(0.1) == 10**17
+    assert scale_rate(10.123456) == 10_123_456 * 10**12
+
+
+def test_conversion_factor_scales_by_the_exponents():
+    # 100 JPY per USD to 10 SEK per USD, 0 and 2 decimals.
+    assert conversion_factor(100, 10, 0, 2) == (1000, 100)
+    assert conversion_factor(10, 100, 2, 0) == (100, 1000)
+
+
+@pytest.fixture
+def handler(tmp_path):
+    feed = tmp_path / "rates_feed.json"
+    feed.write_text(
+        json.dumps(
+            {
+                "timestamp": 1700000000,
+                "rates": {"USD": 1, "SEK": 10.5, "JPY": 150, "KWD": 0.3},
+            }
+        ),
+        encoding="utf-8",
+    )
+    return CurrencyHandler(
+        providers=[FileRateProvider(str(feed))],
+        log_path=str(tmp_path / "currency_log.jsonl"),
+        history_path=str(tmp_path / "historical_rates.bin"),
+        metadata_path=str(tmp_path / "currency_names.json"),
+    )
+
+
+def test_convert_minor_units_is_exact(handler):
+    # 1.05 SEK is exactly 0.10 USD, and 1 USD cent is exactly 1.5 JPY.
+    assert handler.convert_minor_units("SEK", "USD", 105) == 10
+    assert handler.convert_minor_units("USD", "JPY", 1) == 2
+    assert handler.convert_minor_units("USD", "JPY", 1, ROUND_HALF_DOWN) == 1
+    assert handler.convert_minor_units("USD", "JPY", -1) == -2
+    assert handler.convert_minor_units("USD", "JPY", -1, ROUND_FLOOR) == -2
+    assert handler.convert_minor_units("USD", "JPY", -1, ROUND_CEILING) == -1
+    assert handler.convert_minor_units("USD", "KWD", 100) == 300
+
+
+def test_convert_minor_units_rejects_non_integers(handler):
+    with pytest.raises(ValueError):
+        handler.convert_minor_units("USD", "SEK", 1.5)
+    with pytest.raises(ValueError):
+        handler.convert_minor_units_many([1, 2.0], "USD", "SEK")
+
+
+def test_convert_minor_units_many_marks_unknown_codes(handler):
+    assert handler.convert_minor_units_many(
+        [105, -105, 1], ["SEK", "SEK", "XXX"], "USD"
+    ) == [10, -10, None]
@@ -0,0 +1,113 @@
+import threading
+from datetime import date as Date
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from historicalstore import HistoricalRateStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "historical_rates.bin")
+
+
+def test_rates_round_trip_through_a_new_store(path):
+    HistoricalRateStore(path).put_many(
+        {
+            "2024-01-10": {"SEK": 10.5, "EUR": 0.91},
+            "2024-01-12": {"SEK": 10.7},
+        }
+    )
+
+    store = HistoricalRateStore(path)
+    assert store.get_rates("2024-01-10") == {"SEK": 10.5, "EUR": 0.91}
+    assert store.get_rates("2024-01-12") == {"SEK": 10.7}
+    assert store.get_rates("2024-01-11") is None
+    assert store.get_rates("2023-12-31") is None
+    assert store.missing_dates(["2024-01-09", "2024-01-10", "2024-01-11"]) == [
+        "2024-01-09",
+        "2024-01-11",
+    ]
+
+
+def test_get_column_fills_unknown_days_with_nan(path):
+    store = HistoricalRateStore(path)
+    store.put_many({"2024-01-10": {"SEK": 10.5}, "2024-01-12": {"SEK": 10.7}})
+
+    column = store.get_column("SEK", "2024-01-09", "2024-01-13")
+    np.testing.assert_array_equal(column, [np.nan, 10.5, np.nan, 10.7, np.nan])
+    assert np.isnan(store.get_column("EUR", "2024-01-10", "2024-01-12")).all()
+    assert len(store.get_column("SEK", "2024-01-12", "2024-01-10")) == 0
+
+
+def test_rewrite_keeps_rates_when_days_and_codes_are_added(path):
+    store = HistoricalRateStore(path)
+    store.put_rates("2024-01-10", {"SEK": 10.5})
+    # An earlier day and a new code both force the file to be laid out again.
+    store.put_rates("2024-01-05", {"EUR": 0.9})
+    store.put_rates("2024-01-20", {"SEK": 10.9, "NOK": 11.0})
+
+    reopened = HistoricalRateStore(path)
+    for current in (store, reopened):
+        assert current.get_rates("2024-01-05") == {"EUR": 0.9}
+        assert current.get_rates("2024-01-10") == {"SEK": 10.5}
+        assert current.get_rates("2024-01-20") == {"SEK": 10.9, "NOK": 11.0}
+
+
+def test_rates_of_a_day_can_be_replaced(path):
+    store = HistoricalRateStore(path)
+    store.put_rates("2024-01-10", {"SEK": 10.5})
+    store.put_rates("2024-01-10", {"SEK": 10.6})
+    assert HistoricalRateStore(path).get_rates("2024-01-10") == {"SEK": 10.6}
+
+
+def test_put_finished_days_leaves_out_today_and_empty_days(path):
+    store = HistoricalRateStore(path)
+    today = datetime.now(timezone.utc).date()
+    store.put_finished_days(
+        {
+            "2024-01-10": {"SEK": 10.5},
+            "2024-01-11": {},
+            today.isoformat(): {"SEK": 10.6},
+        }
+    )
+    assert store.missing_dates(["2024-01-10", "2024-01-11", today.isoformat()]) == [
+        "2024-01-11",
+        today.isoformat(),
+    ]
+
+
+def test_write_failure_raises_io_error(tmp_path):
+    store = HistoricalRateStore(str(tmp_path / "missing" / "historical_rates.bin"))
+    with pytest.raises(IOError):
+        store.put_rates("2024-01-10", {"SEK": 10.5})
+
+
+def test_readers_see_whole_days_while_the_file_is_rewritten(path):
+    store = HistoricalRateStore(path)
+    store.put_rates("2024-06-01", {"SEK": 10.0, "EUR": 1.0})
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            rates = store.get_rates("2024-06-01")
+            if rates is None or rates["SEK"] != 10.0 or rates["EUR"] != 1.0:
+                errors.append(rates)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    try:
+        start = Date(2024, 5, 31)
+        for offset in range(30):
+            # Every write moves the first day back and adds a code.
+            day = (start - timedelta(days=offset)).isoformat()
+            store.put_rates(day, {f"C{offset:02d}": 1.0})
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+    assert errors == []
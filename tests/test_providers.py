@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+
+import pytest
+
+from metrics import Metrics
+from providers import FileRateProvider, RateProvider, call_providers
+
+
+class StubProvider(RateProvider):
+    def __init__(self, name, rates=None, delay=0.0, error=None):
+        self.name = name
+        self.rates = rates if rates is not None else {"SEK": 10.0}
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.released = threading.Event()
+
+    def fetch_latest(self, conditional=False):
+        self.calls += 1
+        if self.delay:
+            self.released.wait(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {"timestamp": 1700000000, "base": "USD", "rates": dict(self.rates)}
+
+    def fetch_historical(self, date):
+        return {}
+
+    def fetch_currencies(self):
+        return {code: code for code in self.rates}
+
+
+def _latest(provider):
+    return provider.fetch_latest()
+
+
+def test_rate_provider_requires_the_fetch_methods():
+    class Incomplete(RateProvider):
+        def fetch_latest(self, conditional=False):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_falls_back_to_the_next_provider():
+    failing = StubProvider("failing", error=ConnectionError("down"))
+    working = StubProvider("working", rates={"SEK": 11.0})
+    metrics = Metrics()
+
+    provider, snapshot = call_providers([failing, working], _latest, metrics=metrics)
+
+    assert provider is working
+    assert snapshot["rates"] == {"SEK": 11.0}
+    assert failing.calls == working.calls == 1
+    assert (
+        metrics.get_counter(
+            "currency_handler_provider_failures_total", provider="failing"
+        )
+        == 1
+    )
+
+
+def test_raises_the_last_error_when_every_provider_fails():
+    first = StubProvider("first", error=ConnectionError("down"))
+    second = StubProvider("second", error=TimeoutError("slow"))
+
+    with pytest.raises(TimeoutError):
+        call_providers([first, second], _latest)
+    with pytest.raises(TimeoutError):
+        call_providers([first, second], _latest, hedge_after=0.05)
+
+
+def test_no_providers_raises_connection_error():
+    with pytest.raises(ConnectionError):
+        call_providers([], _latest)
+
+
+def test_hedged_request_answers_from_the_faster_provider():
+    slow = StubProvider("slow", rates={"SEK": 10.0}, delay=5.0)
+    fast = StubProvider("fast", rates={"SEK": 12.0})
+    metrics = Metrics()
+
+    start = time.perf_counter()
+    provider, snapshot = call_providers(
+        [slow, fast], _latest, hedge_after=0.05, metrics=metrics
+    )
+    elapsed = time.perf_counter() - start
+    slow.released.set()
+
+    assert provider is fast
+    assert snapshot["rates"] == {"SEK": 12.0}
+    assert elapsed < 1.0
+    assert (
+        metrics.get_counter("currency_handler_hedged_requests_total", provider="fast")
+        == 1
+    )
+
+
+def test_hedging_moves_on_at_once_when_a_provider_fails():
+    failing = StubProvider("failing", error=ConnectionError("down"))
+    working = StubProvider("working")
+
+    start = time.perf_counter()
+    provider, _ = call_providers([failing, working], _latest, hedge_after=5.0)
+
+    assert provider is working
+    assert time.perf_counter() - start < 1.0
+
+
+def test_unexpected_errors_are_not_swallowed():
+    broken = StubProvider("broken", error=KeyError("rates"))
+    working = StubProvider("working")
+
+    with pytest.raises(KeyError):
+        call_providers([broken, working], _latest)
+    with pytest.raises(KeyError):
+        call_providers([broken, working], _latest, hedge_after=5.0)
+    assert working.calls == 0
+
+
+def test_file_provider_reads_rates_and_reports_missing_files(tmp_path):
+    path = tmp_path / "rates_feed.json"
+    path.write_text(
+        json.dumps(
+            {
+                "timestamp": 1700000000,
+                "rates": {"USD": 1.0, "SEK": 10.5},
+                "historical": {"2024-01-15": {"USD": 1.0, "SEK": 10.4}},
+            }
+        ),
+        encoding="utf-8",
+    )
+    provider = FileRateProvider(str(path))
+
+    assert provider.fetch_latest()["rates"] == {"USD": 1.0, "SEK": 10.5}
+    assert provider.fetch_latest(conditional=True) is None
+    assert provider.fetch_historical("2024-01-15")["rates"]["SEK"] == 10.4
+    assert provider.fetch_historical("2024-01-16") == {}
+    assert provider.fetch_currencies() == {"USD": "USD", "SEK": "SEK"}
+
+    with pytest.raises(ConnectionError):
+        FileRateProvider(str(tmp_path / "missing.json")).fetch_latest()
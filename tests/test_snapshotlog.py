@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from snapshotlog import SnapshotLog
+
+
+def _snapshot(timestamp, **changes):
+    rates = {f"C{index}": 1.0 for index in range(10)}
+    rates.update(changes)
+    return {"timestamp": timestamp, "base": "USD", "rates": rates}
+
+
+def _records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "currency_log.jsonl")
+
+
+def test_deltas_between_keyframes_replay_every_snapshot(path):
+    log = SnapshotLog(path, keyframe_interval=3)
+    snapshots = [_snapshot(index, C0=float(index)) for index in range(7)]
+    for index, snapshot in enumerate(snapshots):
+        log.append(snapshot, float(index))
+
+    keyframes = ["k" in record for record in _records(path)]
+    assert keyframes == [True, False, False, True, False, False, True]
+    assert list(SnapshotLog(path).history()) == [
+        (snapshot, float(index)) for index, snapshot in enumerate(snapshots)
+    ]
+    assert SnapshotLog(path).latest() == (snapshots[-1], 6.0)
+
+
+def test_deltas_record_removed_codes_and_fields(path):
+    log = SnapshotLog(path)
+    first = _snapshot(1, C0=2.0)
+    second = {"base": "USD", "rates": dict(first["rates"])}
+    del second["rates"]["C9"]
+    log.append(first, 1.0)
+    log.append(second, 2.0)
+
+    assert _records(path)[1] == {"t": 2.0, "x": ["C9"], "f": {"timestamp": None}}
+    assert SnapshotLog(path).latest() == (second, 2.0)
+
+
+def test_large_changes_are_written_as_keyframes(path):
+    log = SnapshotLog(path)
+    log.append(_snapshot(1), 1.0)
+    log.append(_snapshot(2, **{f"C{index}": 2.0 for index in range(6)}), 2.0)
+    assert "k" in _records(path)[1]
+
+
+def test_snapshot_at_uses_the_keyframe_index(path):
+    log = SnapshotLog(path, keyframe_interval=2)
+    for index in range(5):
+        log.append(_snapshot(index, C0=float(index)), 10.0 * index)
+
+    reopened = SnapshotLog(path)
+    assert reopened.snapshot_at(-1.0) is None
+    assert reopened.snapshot_at(5.0) == (_snapshot(0, C0=0.0), 0.0)
+    assert reopened.snapshot_at(25.0) == (_snapshot(2, C0=2.0), 20.0)
+    assert reopened.snapshot_at(1000.0)[1] == 40.0
+    assert SnapshotLog(str(path) + ".missing").latest() is None
+
+
+def test_missing_index_is_rebuilt(path, tmp_path):
+    log = SnapshotLog(path, keyframe_interval=2)
+    for index in range(4):
+        log.append(_snapshot(index, C0=float(index)), float(index))
+    (tmp_path / "currency_log.jsonl.idx").unlink()
+
+    assert SnapshotLog(path).snapshot_at(2.5) == (_snapshot(2, C0=2.0), 2.0)
+
+
+def test_appends_continue_an_existing_log(path):
+    SnapshotLog(path).append(_snapshot(1), 1.0)
+    SnapshotLog(path).append(_snapshot(2, C0=2.0), 2.0)
+
+    assert "k" not in _records(path)[1]
+    assert SnapshotLog(path).latest() == (_snapshot(2, C0=2.0), 2.0)
+
+
+def test_partial_last_line_is_skipped(path):
+    log = SnapshotLog(path)
+    log.append(_snapshot(1), 1.0)
+    with open(path, "ab") as f:
+        f.write(b'{"t":2.0,"r":{"C0"')
+
+    SnapshotLog(path).append(_snapshot(3, C0=3.0), 3.0)
+    assert [fetched_at for _, fetched_at in SnapshotLog(path).history()] == [1.0, 3.0]
+    assert SnapshotLog(path).latest() == (_snapshot(3, C0=3.0), 3.0)
+
+
+def test_two_writers_share_one_delta_chain(path):
+    first = SnapshotLog(path)
+    second = SnapshotLog(path)
+    first.append(_snapshot(1), 1.0)
+    second.append(_snapshot(2, C0=2.0), 2.0)
+    first.append(_snapshot(3), 3.0)
+
+    assert first.latest() == (_snapshot(3), 3.0)
+    assert [snapshot["rates"]["C0"] for snapshot, _ in SnapshotLog(path).history()] == [
+        1.0,
+        2.0,
+        1.0,
+    ]
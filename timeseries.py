@@ -0,0 +1,277 @@
+import collections
+import math
+from datetime import date as Date
+from typing import Iterable, Iterator
+
+import numpy as np
+
+
+class RateSeries:
+    """
+    Compact daily rate series for one currency with rolling statistics.
+
+    Dates are kept as day ordinals in an int32 array and rates in a float64
+    array, 12 bytes per day instead of a tuple, a date string and a float
+    object. The arrays grow by doubling, so appends are amortized O(1). The min,
+    max, mean, standard deviation and percent change of every configured window
+    are kept up to date as values are appended, so reading them doesn't rescan
+    the series.
+
+    Windows count observations, not calendar days, so days without a rate
+    don't leave gaps in a window.
+    """
+
+    def __init__(self, currency: str, windows: Iterable[int] = (7, 30)):
+        """
+        Initialize an empty series.
+
+        Args:
+            currency: 3-letter code of the currency the rates are for.
+            windows: Sizes, in observations, of the rolling windows to maintain.
+
+        Raises:
+            ValueError: If a window size is smaller than 1.
+        """
+        self.currency = currency
+        self._ordinals = np.empty(16, dtype=np.int32)
+        self._values = np.empty(16, dtype=np.float64)
+        self._size = 0
+        self._windows: dict[int, _RollingWindow] = {}
+        for size in windows:
+            if size < 1:
+                raise ValueError("Window sizes must be at least 1.")
+            self._windows[size] = _RollingWindow(size)
+
+    @classmethod
+    def from_column(
+        cls,
+        currency: str,
+        start_date: str,
+        column: np.ndarray,
+        windows: Iterable[int] = (7, 30),
+    ) -> "RateSeries":
+        """
+        Build a series from one value per consecutive day, NaN for missing days.
+
+        Args:
+            currency: 3-letter code of the currency the rates are for.
+            start_date: Date of the first value in YYYY-MM-DD format.
+            column: float64 array with one value per day, as returned by
+                HistoricalRateStore.get_column.
+            windows: Sizes of the rolling windows to maintain.
+
+        Returns:
+            A series with one entry per day that has a rate.
+        """
+        series = cls(currency, windows)
+        start = Date.fromisoformat(start_date).toordinal()
+        for offset in np.flatnonzero(~np.isnan(column)).tolist():
+            series._append_ordinal(start + offset, float(column[offset]))
+        return series
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[tuple[str, float]]:
+        size = self._size
+        for ordinal, value in zip(
+            self._ordinals[:size].tolist(), self._values[:size].tolist()
+        ):
+            yield Date.fromordinal(ordinal).isoformat(), value
+
+    @property
+    def windows(self) -> list[int]:
+        """
+        Sizes of the maintained rolling windows.
+        """
+        return list(self._windows)
+
+    @property
+    def dates(self) -> list[str]:
+        """
+        Dates of the series in YYYY-MM-DD format, oldest first.
+        """
+        return [
+            Date.fromordinal(ordinal).isoformat()
+            for ordinal in self._ordinals[: self._size].tolist()
+        ]
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        Read-only float64 view of the rates, oldest first, without copying them.
+        """
+        values = self._values[: self._size]
+        values.flags.writeable = False
+        return values
+
+    def append(self, date: str, rate: float) -> None:
+        """
+        Add the rate of the day after the last one in the series, or later.
+
+        Args:
+            date: Date in YYYY-MM-DD format
+            rate: Rate for that date.
+
+        Raises:
+            ValueError: If the date isn't after the last date or rate is NaN.
+        """
+        self._append_ordinal(Date.fromisoformat(date).toordinal(), rate)
+
+    def extend(self, rates: Iterable[tuple[str, float]]) -> None:
+        """
+        Append (date, rate) pairs in date order.
+
+        Args:
+            rates: Pairs as returned by list_historical_rates_for_currency.
+        """
+        for date, rate in rates:
+            self.append(date, rate)
+
+    def stats(self, window: int) -> dict[str, float | int]:
+        """
+        Get the statistics of the latest window.
+
+        Args:
+            window: Size of one of the maintained windows.
+
+        Returns:
+            A dictionary with count, min, max, mean, stddev (population) and
+            pct_change, the change in percent from the oldest to the newest rate
+            in the window. Values are NaN while the series is empty.
+
+        Raises:
+            ValueError: If the window isn't maintained by this series.
+        """
+        if window not in self._windows:
+            raise ValueError(f"Window {window} is not maintained by this series.")
+        return self._windows[window].stats(self._values, self._size)
+
+    def rolling(self, window: int) -> dict[str, np.ndarray]:
+        """
+        Compute the statistics of every full window over the whole series.
+
+        This is a vectorized pass for charts and doesn't need window to be one
+        of the maintained ones.
+
+        Args:
+            window: Window size in observations.
+
+        Returns:
+            A dictionary of arrays, one value per window ending at each date
+            from the window-th date on: dates, min, max, mean, stddev and
+            pct_change.
+
+        Raises:
+            ValueError: If window is smaller than 1.
+        """
+        if window < 1:
+            raise ValueError("Window sizes must be at least 1.")
+
+        if self._size < window:
+            windows = np.empty((0, window))
+        else:
+            windows = np.lib.stride_tricks.sliding_window_view(self.values, window)
+        ordinals = self._ordinals[window - 1 : self._size]
+        epoch = Date(1970, 1, 1).toordinal()
+        return {
+            "dates": (ordinals - epoch).astype("datetime64[D]"),
+            "min": windows.min(axis=1),
+            "max": windows.max(axis=1),
+            "mean": windows.mean(axis=1),
+            "stddev": windows.std(axis=1),
+            "pct_change": (windows[:, -1] / windows[:, 0] - 1) * 100,
+        }
+
+    def _append_ordinal(self, ordinal: int, rate: float) -> None:
+        size = self._size
+        if size and ordinal <= self._ordinals[size - 1]:
+            raise ValueError("Rates must be appended in date order.")
+        if math.isnan(rate):
+            raise ValueError("A rate can't be NaN.")
+
+        if size == len(self._values):
+            # Views handed out earlier keep pointing at the old buffers.
+            self._ordinals = np.resize(self._ordinals, 2 * size)
+            self._values = np.resize(self._values, 2 * size)
+        self._ordinals[size] = ordinal
+        self._values[size] = rate
+        self._size = size + 1
+        for window in self._windows.values():
+            window.push(self._values, size)
+
+
+class _RollingWindow:
+    # Statistics of the last size values of the series' value array. Sums are
+    # taken around a recent value to limit cancellation in the variance, and
+    # min/max use monotonic queues of indices, all O(1) amortized per push.
+
+    def __init__(self, size: int):
+        self.size = size
+        self._shift = 0.0
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._min_queue: collections.deque[int] = collections.deque()
+        self._max_queue: collections.deque[int] = collections.deque()
+
+    def push(self, values: np.ndarray, index: int) -> None:
+        value = values[index]
+        if index == 0:
+            self._shift = value
+
+        first = index - self.size + 1
+        if index % self.size == self.size - 1:
+            # Once per window length the sums are recomputed around the current
+            # window, so rounding errors and trends can't build up.
+            window = values[first : index + 1]
+            self._shift = float(window[0])
+            shifted = window - self._shift
+            self._sum = float(shifted.sum())
+            self._sum_squares = float(shifted @ shifted)
+        else:
+            shifted = value - self._shift
+            self._sum += shifted
+            self._sum_squares += shifted * shifted
+            if index >= self.size:
+                dropped = values[index - self.size] - self._shift
+                self._sum -= dropped
+                self._sum_squares -= dropped * dropped
+
+        min_queue = self._min_queue
+        while min_queue and values[min_queue[-1]] >= value:
+            min_queue.pop()
+        min_queue.append(index)
+        if min_queue[0] < first:
+            min_queue.popleft()
+
+        max_queue = self._max_queue
+        while max_queue and values[max_queue[-1]] <= value:
+            max_queue.pop()
+        max_queue.append(index)
+        if max_queue[0] < first:
+            max_queue.popleft()
+
+    def stats(self, values: np.ndarray, length: int) -> dict[str, float | int]:
+        count = min(length, self.size)
+        if count == 0:
+            nan = math.nan
+            return {
+                "count": 0,
+                "min": nan,
+                "max": nan,
+                "mean": nan,
+                "stddev": nan,
+                "pct_change": nan,
+            }
+
+        mean = self._sum / count
+        variance = max(self._sum_squares / count - mean * mean, 0.0)
+        first = values[length - count]
+        return {
+            "count": count,
+            "min": float(values[self._min_queue[0]]),
+            "max": float(values[self._max_queue[0]]),
+            "mean": float(mean + self._shift),
+            "stddev": math.sqrt(variance),
+            "pct_change": float((values[length - 1] / first - 1) * 100),
+        }
@@ -0,0 +1,158 @@
+import collections
+import math
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+HIGH_PRIORITY = "high"
+LOW_PRIORITY = "low"
+
+
+class QuotaExceededError(ConnectionError):
+    """
+    Raised when a request is refused because the request budget is used up.
+    """
+
+
+class SingleFlight:
+    """
+    Lets concurrent callers asking for the same key share one call.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running wait for it and get the same result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, "_Call"] = {}
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        """
+        Run function for key, or wait for the call already running for it.
+
+        Args:
+            key: Identifies the resource, e.g. a URL.
+            function: Called without arguments to produce the result.
+
+        Returns:
+            The result of the shared call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class RequestBudget:
+    """
+    Sliding-window budget of upstream requests.
+
+    At most limit requests are allowed in any interval seconds. The last part of
+    the budget, set by reserve, is kept for high-priority requests: low-priority
+    requests are deferred for up to low_priority_wait seconds and then rejected
+    once the remaining budget is down to the reserve.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        interval: float,
+        reserve: float = 0.2,
+        max_wait: float = 0.0,
+        low_priority_wait: float = 0.0,
+    ):
+        """
+        Initialize the budget.
+
+        Args:
+            limit: Requests allowed per interval.
+            interval: Length of the window in seconds, e.g. 30 days for a
+                monthly API quota.
+            reserve: Share of limit only high-priority requests may use.
+            max_wait: Seconds a high-priority request may wait for budget
+                before it's rejected.
+            low_priority_wait: Seconds a low-priority request may wait for
+                budget before it's rejected.
+        """
+        self.limit = limit
+        self.interval = interval
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.low_priority_wait = low_priority_wait
+        self._sent: collections.deque[float] = collections.deque()
+        self._condition = threading.Condition()
+
+    @property
+    def remaining(self) -> int:
+        """
+        Requests left in the current window.
+        """
+        with self._condition:
+            self._prune(time.monotonic())
+            return self.limit - len(self._sent)
+
+    def acquire(self, priority: str = HIGH_PRIORITY) -> None:
+        """
+        Take one request from the budget, waiting for room if allowed.
+
+        Args:
+            priority: HIGH_PRIORITY or LOW_PRIORITY.
+
+        Raises:
+            QuotaExceededError: If there is no room within the allowed wait.
+        """
+        if priority == LOW_PRIORITY:
+            floor = int(self.limit * self.reserve)
+            deadline = time.monotonic() + self.low_priority_wait
+        else:
+            floor = 0
+            deadline = time.monotonic() + self.max_wait
+
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                if self.limit - len(self._sent) > floor:
+                    self._sent.append(now)
+                    return
+
+                # Room opens up when the oldest requests leave the window.
+                oldest_blocking = len(self._sent) - self.limit + floor
+                frees_at = math.inf
+                if oldest_blocking < len(self._sent):
+                    frees_at = self._sent[oldest_blocking] + self.interval
+                if frees_at > deadline:
+                    raise QuotaExceededError(
+                        f"Request budget of {self.limit} per {self.interval:g}s "
+                        f"is used up for {priority} priority requests."
+                    )
+                self._condition.wait(frees_at - now)
+
+    def _prune(self, now: float) -> None:
+        while self._sent and self._sent[0] <= now - self.interval:
+            self._sent.popleft()